@@ -0,0 +1,175 @@
+####################################################
+# Incrementally scored bus assignment.
+#
+# Keeps, for every bus, the number of kept friendships inside it and, for
+# every rowdy group, how many of its students ride each bus. A group is
+# unbroken while all its students share one bus; students of unbroken
+# groups do not count, exactly like score_output. Moving a student only
+# rescans the friendships of that student, plus those of the students of
+# any rowdy group the move completes or breaks up.
+####################################################
+
+
+class AssignmentState:
+    '''
+        A bus assignment of an Instance whose score is kept up to date as students move
+
+        Inputs:
+            instance - an instance_cache.Instance
+            buses - a list of buses, each a list of students 0..n-1
+    '''
+
+    def __init__(self, instance, buses):
+        num_students = len(instance.labels)
+        self.num_buses = len(buses)
+        self.size_bus = instance.size_bus
+        self.num_edges = len(instance.edges)
+
+        indptr = instance.indptr.tolist()
+        indices = instance.indices.tolist()
+        self.neighbors = [indices[indptr[i]:indptr[i + 1]] for i in range(num_students)]
+
+        rowdy_ptr = instance.rowdy_ptr.tolist()
+        rowdy_members = instance.rowdy_members.tolist()
+        self.groups = [sorted(set(rowdy_members[rowdy_ptr[g]:rowdy_ptr[g + 1]])) for g in range(len(rowdy_ptr) - 1)]
+        member_ptr = instance.member_ptr.tolist()
+        member_groups = instance.member_groups.tolist()
+        self.memberships = [member_groups[member_ptr[i]:member_ptr[i + 1]] for i in range(num_students)]
+
+        self.bus_of = [-1] * num_students
+        self.sizes = [0] * self.num_buses
+        for i, bus in enumerate(buses):
+            for student in bus:
+                self.bus_of[student] = i
+            self.sizes[i] = len(bus)
+        if -1 in self.bus_of:
+            raise ValueError("every student must be assigned a bus")
+
+        # occupancy[g] maps a bus to the number of students of group g on it
+        self.occupancy = []
+        self.dead = [0] * num_students
+        for group in self.groups:
+            occupancy = {}
+            for student in group:
+                bus = self.bus_of[student]
+                occupancy[bus] = occupancy.get(bus, 0) + 1
+            self.occupancy.append(occupancy)
+            if len(occupancy) <= 1:
+                for student in group:
+                    self.dead[student] += 1
+
+        self.internal = [0] * self.num_buses
+        self.kept = 0
+        self._tally(range(num_students), 1)
+
+    def _tally(self, students, sign):
+        '''
+            Adds (sign 1) or removes (sign -1) the kept friendships touching students,
+            counting a friendship between two of them once
+        '''
+        bus_of = self.bus_of
+        dead = self.dead
+        inside = students if isinstance(students, (set, range)) else set(students)
+        change = 0
+        for w in students:
+            if dead[w]:
+                continue
+            bus = bus_of[w]
+            count = 0
+            for u in self.neighbors[w]:
+                if u < w and u in inside:
+                    continue
+                if bus_of[u] == bus and not dead[u]:
+                    count += 1
+            self.internal[bus] += sign * count
+            change += count
+        self.kept += sign * change
+        return sign * change
+
+    def is_unbroken(self, group):
+        return len(self.occupancy[group]) <= 1
+
+    def score(self):
+        return self.kept / self.num_edges if self.num_edges else 0
+
+    def move(self, student, bus):
+        '''
+            Moves student onto bus and returns the change in kept friendships.
+            Does not check the bus size, callers are expected to.
+        '''
+        old = self.bus_of[student]
+        if old == bus:
+            return 0
+
+        flips = []
+        for g in self.memberships[student]:
+            occupancy = self.occupancy[g]
+            was_unbroken = len(occupancy) <= 1
+            if occupancy[old] == 1:
+                del occupancy[old]
+            else:
+                occupancy[old] -= 1
+            occupancy[bus] = occupancy.get(bus, 0) + 1
+            if (len(occupancy) <= 1) != was_unbroken:
+                flips.append(g)
+
+        if flips:
+            affected = {student}
+            for g in flips:
+                affected.update(self.groups[g])
+        else:
+            affected = (student,)
+
+        change = self._tally(affected, -1)
+        self.bus_of[student] = bus
+        self.sizes[old] -= 1
+        self.sizes[bus] += 1
+        for g in flips:
+            step = 1 if len(self.occupancy[g]) <= 1 else -1
+            for w in self.groups[g]:
+                self.dead[w] += step
+        change += self._tally(affected, 1)
+        return change
+
+    def move_change(self, student, bus):
+        '''
+            Returns the change in kept friendships moving student onto bus would make. The move
+            is only made, and undone, when it completes or breaks up a rowdy group.
+        '''
+        bus_of = self.bus_of
+        old = bus_of[student]
+        if old == bus:
+            return 0
+        for g in self.memberships[student]:
+            occupancy = self.occupancy[g]
+            spread = len(occupancy) - (occupancy[old] == 1) + (bus not in occupancy)
+            if (spread <= 1) != (len(occupancy) <= 1):
+                change = self.move(student, bus)
+                self.move(student, old)
+                return change
+
+        dead = self.dead
+        if dead[student]:
+            return 0
+        change = 0
+        for u in self.neighbors[student]:
+            if u != student and not dead[u]:
+                if bus_of[u] == bus:
+                    change += 1
+                elif bus_of[u] == old:
+                    change -= 1
+        return change
+
+    def swap(self, first, second):
+        '''
+            Swaps the buses of two students and returns the change in kept friendships
+        '''
+        first_bus = self.bus_of[first]
+        second_bus = self.bus_of[second]
+        return self.move(first, second_bus) + self.move(second, first_bus)
+
+    def solution(self):
+        buses = [[] for _ in range(self.num_buses)]
+        for student, bus in enumerate(self.bus_of):
+            buses[bus].append(student)
+        return buses
@@ -0,0 +1,81 @@
+import os
+from multiprocessing import Pool
+
+from corpus_pack import input_parser, open_pack
+from instance_cache import load_instance, to_input
+
+####################################################
+# Helpers for the scripts which run over a whole size category.
+#
+# A category is either a folder of input folders or a pack of one built by
+# corpus_pack.py. Each process opens a pack only once, so pool workers
+# reading the same pack share its pages instead of parsing their own copy.
+####################################################
+
+_corpora = {}
+_parsers = {}
+
+
+def _corpus(pack_path):
+    if pack_path not in _corpora:
+        _corpora[pack_path] = open_pack(pack_path)
+    return _corpora[pack_path]
+
+
+def is_pack(input_dir):
+    return input_dir.endswith('.pack')
+
+
+def category_names(input_dir):
+    '''
+        Returns the inputs of a size category folder or pack, sorted by name
+    '''
+    if is_pack(input_dir):
+        names = _corpus(input_dir).names()
+    else:
+        names = [name for name in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, name))]
+    return sorted(names, key=lambda name: (len(name), name))
+
+
+def load_category_instance(input_dir, input_name):
+    '''
+        Loads an input of a size category folder or pack as an Instance
+    '''
+    if is_pack(input_dir):
+        return _corpus(input_dir).load_instance(input_name)
+    return load_instance(input_dir + '/' + input_name)
+
+
+def read_category_input(input_dir, input_name):
+    '''
+        Loads an input of a size category folder or pack in the form of output_scorer.read_input
+    '''
+    return to_input(load_category_instance(input_dir, input_name))
+
+
+def parse_category_input(category_path, input_name):
+    '''
+        Parses an input of a size category folder in the form of instance_cache.parse_input,
+        reading it from the category's pack if one has been built
+    '''
+    if category_path not in _parsers:
+        _parsers[category_path] = input_parser(category_path)
+    return _parsers[category_path](input_name)
+
+
+def imap_jobs(function, tasks, jobs, ordered=True):
+    '''
+        Yields function(task) for every task, running up to jobs of them at a
+        time in a process pool. Results are yielded as soon as they and
+        everything before them have finished, or as soon as they finish if
+        ordered is False.
+    '''
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+
+    with Pool(min(jobs, len(tasks))) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(function, tasks):
+            yield result
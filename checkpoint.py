@@ -0,0 +1,68 @@
+import time
+
+from instance_cache import write_output
+from output_scorer import output_score
+from scoring import score_solution
+
+####################################################
+# Keeps the best assignment found so far on disk while a solver runs.
+#
+# Anytime solvers take a callback which they call with every assignment
+# better than the ones they reported before. An OutputCheckpoint is such a
+# callback: it scores the assignment exactly and, when it beats the best one
+# so far, starting with the output already on disk, replaces the output file
+# with it through write_output, which writes to a temporary file and renames
+# it. Writes are at least CHECKPOINT_INTERVAL seconds apart, so a solver
+# improving many times a second does not spend its time writing, and flush
+# writes the last one.
+####################################################
+
+# Fewest seconds between two writes of the same output
+CHECKPOINT_INTERVAL = 1.0
+
+
+class OutputCheckpoint:
+    '''
+        A callback writing the best assignment it is given to an output file
+
+        Inputs:
+            output_path - the .out file to write
+            instance - the instance_cache.Instance being solved
+            interval - the fewest seconds between two writes
+    '''
+
+    def __init__(self, output_path, instance, interval=CHECKPOINT_INTERVAL):
+        self.output_path = output_path
+        self.instance = instance
+        self.labels = instance.labels.tolist()
+        self.interval = interval
+        # an output already on disk is only replaced by a better one
+        self.best_score = output_score(instance, output_path)
+        self.best_solution = None
+        self.pending = False
+        self.written_at = None
+
+    def __call__(self, solution, score=None):
+        '''
+            Takes a valid assignment, a list of buses of students 0..n-1, with its score
+            if it is already known, and returns whether it is the best so far
+        '''
+        if score is None:
+            score = score_solution(self.instance, solution)
+        if score <= self.best_score:
+            return False
+        self.best_score = score
+        self.best_solution = [list(bus) for bus in solution]
+        self.pending = True
+        if self.written_at is None or time.perf_counter() - self.written_at >= self.interval:
+            self.flush()
+        return True
+
+    def flush(self):
+        '''
+            Writes the best assignment so far if it is not on disk yet
+        '''
+        if self.pending:
+            write_output(self.output_path, self.best_solution, self.labels)
+            self.pending = False
+            self.written_at = time.perf_counter()
@@ -0,0 +1,103 @@
+####################################################
+# A cluster being grown in a graph, together with its fringe.
+#
+# links[v] counts the friends v has inside the cluster, for the students
+# of the cluster as well as for the rest of the graph. The fringe is every
+# student outside the cluster with at least one such friend, bucketed by
+# their count. Moving a student into or out of the cluster only touches
+# that student's friends. Self-loops are ignored.
+####################################################
+
+
+class ClusterState:
+    '''
+        Friend counts of one cluster at a time in a graph over the students 0..n-1
+
+        Inputs:
+            graph - a networkx graph, read through as it shrinks between clusters
+    '''
+
+    def __init__(self, graph):
+        self.graph = graph
+        size = max(graph.nodes(), default=-1) + 1
+        self.links = [0] * size
+        self.inside = [False] * size
+        self.cluster = set()
+        self.fringe = set()
+        # buckets[c] is the set of fringe students with c friends in the cluster
+        self.buckets = {}
+        self.touched = []
+
+    def neighbors(self, student):
+        return (u for u in self.graph[student] if u != student)
+
+    def start(self, cluster):
+        '''
+            Forgets the previous cluster and starts over from the students of cluster
+        '''
+        for v in self.touched:
+            self.links[v] = 0
+            self.inside[v] = False
+        self.touched = []
+        self.cluster = set()
+        self.fringe = set()
+        self.buckets = {}
+        for student in cluster:
+            self.add(student)
+
+    def _bucket(self, student, old, new):
+        if old:
+            bucket = self.buckets[old]
+            bucket.discard(student)
+            if not bucket:
+                del self.buckets[old]
+        if new:
+            self.buckets.setdefault(new, set()).add(student)
+            self.fringe.add(student)
+        else:
+            self.fringe.discard(student)
+
+    def add(self, student):
+        links = self.links
+        if not self.inside[student]:
+            self._bucket(student, links[student], 0)
+        self.inside[student] = True
+        self.cluster.add(student)
+        self.touched.append(student)
+        for u in self.neighbors(student):
+            links[u] += 1
+            self.touched.append(u)
+            if not self.inside[u]:
+                self._bucket(u, links[u] - 1, links[u])
+
+    def remove(self, student):
+        links = self.links
+        self.inside[student] = False
+        self.cluster.remove(student)
+        for u in self.neighbors(student):
+            links[u] -= 1
+            if not self.inside[u]:
+                self._bucket(u, links[u] + 1, links[u])
+        self._bucket(student, 0, links[student])
+
+    def loneliest(self):
+        '''
+            Returns the student of the cluster with the fewest friends in it, the lowest on ties
+        '''
+        return min(self.cluster, key=lambda v: (self.links[v], v))
+
+    def swap_candidates(self, removed):
+        '''
+            Yields the fringe students who would have more friends in the cluster without
+            removed than removed has, most friends first and then lowest first
+        '''
+        floor = self.links[removed]
+        adjacent = set(self.neighbors(removed))
+        level = max(self.buckets, default=0)
+        while level > floor:
+            # a friend of removed loses one of their links along with removed
+            candidates = [v for v in self.buckets.get(level, ()) if v not in adjacent]
+            candidates += [v for v in self.buckets.get(level + 1, ()) if v in adjacent]
+            for v in sorted(candidates):
+                yield v
+            level -= 1
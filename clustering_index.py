@@ -0,0 +1,81 @@
+import heapq
+
+####################################################
+# Clustering coefficients of a graph which loses nodes over time.
+#
+# The solvers peel one bus at a time off the remaining graph and start each
+# bus from the node with the best clustering coefficient. Recomputing
+# nx.clustering after every bus is quadratic in the number of buses, so the
+# triangle counts are kept instead and only the neighbors of removed nodes
+# are updated. Values match nx.clustering exactly: self-loops are ignored
+# and a node with t triangle corners (twice its triangles) and degree d has
+# coefficient t / (d * (d - 1)).
+####################################################
+
+
+class ClusteringIndex:
+    '''
+        Triangle counts and clustering coefficients of the remaining nodes of a graph
+
+        Inputs:
+            graph - a networkx graph, which is not modified
+            with_degree - if True, seeds are ranked by clustering coefficient plus degree
+                          instead of clustering coefficient alone
+    '''
+
+    def __init__(self, graph, with_degree=False):
+        self.with_degree = with_degree
+        self.adjacency = {node: set(graph.neighbors(node)) - {node} for node in graph.nodes()}
+        # corners[v] is twice the number of triangles through v, like nx.clustering
+        self.corners = {}
+        self.clustering = {}
+        self.queue = []
+        for node, neighbors in self.adjacency.items():
+            self.corners[node] = sum(len(neighbors & self.adjacency[u]) for u in neighbors)
+            self._update(node)
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    def _key(self, node):
+        if self.with_degree:
+            return self.clustering[node] + len(self.adjacency[node])
+        return self.clustering[node]
+
+    def _update(self, node):
+        t = self.corners[node]
+        d = len(self.adjacency[node])
+        self.clustering[node] = 0 if t == 0 else t / (d * (d - 1))
+        heapq.heappush(self.queue, (-self._key(node), node))
+
+    def remove_nodes(self, nodes):
+        '''
+            Removes nodes, updating only the nodes which shared an edge or a triangle with them
+        '''
+        touched = set()
+        for node in nodes:
+            neighbors = self.adjacency.pop(node)
+            del self.corners[node]
+            del self.clustering[node]
+            for u in neighbors:
+                u_neighbors = self.adjacency[u]
+                u_neighbors.discard(node)
+                self.corners[u] -= 2 * len(neighbors & u_neighbors)
+                touched.add(u)
+        touched.difference_update(nodes)
+        for node in touched:
+            if node in self.adjacency:
+                self._update(node)
+
+    def best(self):
+        '''
+            Returns the remaining node with the highest key, the lowest such node on ties,
+            or None if no node is left
+        '''
+        queue = self.queue
+        while queue:
+            key, node = queue[0]
+            if node in self.adjacency and key == -self._key(node):
+                return node
+            heapq.heappop(queue)
+        return None
@@ -0,0 +1,246 @@
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from instance_cache import Instance, load_instance, parse_input, to_graph, to_input
+
+####################################################
+# Packs a whole size category of inputs into one file.
+#
+# To run:
+#   python3 corpus_pack.py <category_folder> [<pack_file>]
+#   python3 corpus_pack.py --check <category_folder> [<pack_file>]
+#
+#   category_folder - the path to a size category, e.g. ./all_inputs/medium
+#   pack_file - where to write the pack, defaults to <category_folder>.pack
+#
+# Layout: an 8 byte magic, the length of a JSON index, the index itself and
+# then every array of every instance, each aligned to ALIGNMENT bytes. The
+# index maps instance names to their parameters and to the offset, dtype
+# and shape of each array, so a reader mmaps the file once and hands out
+# zero-copy NumPy views. Packs are not refreshed on their own, rerun this
+# script after changing the inputs (--check lists the stale instances).
+####################################################
+
+MAGIC = b'BUSPACK1'
+PACK_VERSION = 2
+ALIGNMENT = 64
+
+ARRAY_FIELDS = [field for field in Instance._fields if field not in ("num_buses", "size_bus")]
+
+
+def default_pack_path(category_path):
+    return category_path.rstrip("/") + ".pack"
+
+
+def _stamp(folder_name):
+    stamps = {}
+    for file_name in ("graph.gml", "parameters.txt"):
+        st = os.stat(os.path.join(folder_name, file_name))
+        stamps[file_name] = [st.st_size, st.st_mtime_ns]
+    return stamps
+
+
+def _pad(offset):
+    return -offset % ALIGNMENT
+
+
+def pack_category(category_path, pack_path=None):
+    '''
+        Writes every instance of a size category into a single pack file
+
+        Inputs:
+            category_path - a string representing the path to the size category folder
+            pack_path - the file to write, defaults to <category_path>.pack
+
+        Outputs:
+            (packed, skipped)
+            packed - the names of the packed instances
+            skipped - (name, reason) for every folder which could not be loaded
+    '''
+    if pack_path is None:
+        pack_path = default_pack_path(category_path)
+
+    index = {"version": PACK_VERSION, "instances": {}}
+    blobs = []
+    skipped = []
+    offset = 0
+    for name in sorted(os.listdir(category_path), key=lambda n: (len(n), n)):
+        folder_name = os.path.join(category_path, name)
+        if not os.path.isdir(folder_name):
+            continue
+        try:
+            instance = load_instance(folder_name)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            skipped.append((name, "{}: {}".format(type(e).__name__, e)))
+            continue
+
+        entry = {
+            "num_buses": instance.num_buses,
+            "size_bus": instance.size_bus,
+            "stamps": _stamp(folder_name),
+            "arrays": {},
+        }
+        for field in ARRAY_FIELDS:
+            array = np.ascontiguousarray(getattr(instance, field))
+            entry["arrays"][field] = [offset, array.dtype.str, list(array.shape)]
+            blobs.append(array)
+            offset += array.nbytes
+            blobs.append(_pad(offset))
+            offset += _pad(offset)
+        index["instances"][name] = entry
+
+    header = json.dumps(index).encode()
+    start = len(MAGIC) + 8 + len(header)
+    start += _pad(start)
+
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b'\0' * (start - f.tell()))
+        for blob in blobs:
+            if isinstance(blob, int):
+                f.write(b'\0' * blob)
+            else:
+                f.write(blob.tobytes())
+    os.replace(tmp_path, pack_path)
+    return list(index["instances"]), skipped
+
+
+class PackedCorpus:
+    '''
+        A read-only view of a pack file. Instances are NumPy views into one
+        shared memory map, so processes that open the same pack share its pages.
+    '''
+
+    def __init__(self, pack_path):
+        self.path = pack_path
+        self._file = open(pack_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("{} is not a pack file".format(pack_path))
+        header_length, = struct.unpack_from("<Q", self._map, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        self._index = json.loads(self._map[header_start:header_start + header_length])
+        if self._index.get("version") != PACK_VERSION:
+            self.close()
+            raise ValueError("{} was written by an older version of corpus_pack.py".format(pack_path))
+        self._data_start = header_start + header_length + _pad(header_start + header_length)
+
+    def close(self):
+        # views handed out keep the map alive, so only drop our references
+        self._map = None
+        self._file.close()
+
+    def names(self):
+        return list(self._index["instances"])
+
+    def __contains__(self, name):
+        return name in self._index["instances"]
+
+    def __len__(self):
+        return len(self._index["instances"])
+
+    def load_instance(self, name):
+        '''
+            Returns the Instance packed under name without copying its arrays
+        '''
+        entry = self._index["instances"][name]
+        fields = {"num_buses": entry["num_buses"], "size_bus": entry["size_bus"]}
+        for field, (offset, dtype, shape) in entry["arrays"].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            array = np.frombuffer(self._map, dtype=dtype, count=count, offset=self._data_start + offset)
+            fields[field] = array.reshape(shape)
+        return Instance(**fields)
+
+    def parse_input(self, name):
+        '''
+            Same as instance_cache.parse_input for a packed instance
+        '''
+        instance = self.load_instance(name)
+        graph, constraints = to_graph(instance)
+        return graph, instance.num_buses, instance.size_bus, constraints
+
+    def read_input(self, name):
+        '''
+            Same as output_scorer.read_input for a packed instance
+        '''
+        return to_input(self.load_instance(name))
+
+    def stale(self, category_path):
+        '''
+            Returns the names whose source files changed or disappeared since packing,
+            plus folders of category_path which are not in the pack
+        '''
+        stale = []
+        for name, entry in self._index["instances"].items():
+            try:
+                if _stamp(os.path.join(category_path, name)) != entry["stamps"]:
+                    stale.append(name)
+            except OSError:
+                stale.append(name)
+        for name in os.listdir(category_path):
+            folder_name = os.path.join(category_path, name)
+            if name not in self and os.path.exists(os.path.join(folder_name, "graph.gml")) \
+                    and os.path.exists(os.path.join(folder_name, "parameters.txt")):
+                stale.append(name)
+        return stale
+
+
+def open_pack(pack_path):
+    return PackedCorpus(pack_path)
+
+
+def open_category(category_path):
+    '''
+        Opens the pack of a size category if one has been built, otherwise returns None
+    '''
+    pack_path = default_pack_path(category_path)
+    if os.path.exists(pack_path):
+        return PackedCorpus(pack_path)
+    return None
+
+
+def input_parser(category_path):
+    '''
+        Returns a function which parses an input of a size category by name, reading
+        it from the category's pack if one has been built and from its folder otherwise
+    '''
+    corpus = open_category(category_path)
+
+    def parse(input_name):
+        if corpus is not None and input_name in corpus:
+            return corpus.parse_input(input_name)
+        return parse_input(category_path + "/" + input_name)
+
+    return parse
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    check = "--check" in args
+    args = [arg for arg in args if arg != "--check"]
+    if not 1 <= len(args) <= 2:
+        print("Format: python3 corpus_pack.py [--check] <category_folder> [<pack_file>]")
+        sys.exit(1)
+    category_path = args[0]
+    pack_path = args[1] if len(args) > 1 else default_pack_path(category_path)
+
+    if check:
+        corpus = open_pack(pack_path)
+        stale = corpus.stale(category_path)
+        print('stale', stale)
+        sys.exit(1 if stale else 0)
+
+    packed, skipped = pack_category(category_path, pack_path)
+    for name, reason in skipped:
+        print('skipped', name, reason)
+    print('packed {} instances into {} ({} bytes)'.format(len(packed), pack_path, os.path.getsize(pack_path)))
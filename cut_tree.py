@@ -0,0 +1,153 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components, maximum_flow
+
+####################################################
+# Gomory-Hu cut trees, for splitting a graph with minimum cuts.
+#
+# Every connected component gets one Gomory-Hu tree, built with Gusfield's
+# algorithm out of |V| - 1 maximum flows. Each tree edge stands for a cut of
+# the component, and the lightest one is a minimum cut of it. Splitting a
+# part along a tree edge removes the friendships crossing that cut; every
+# removed friendship lowers the value of the tree edges on the tree path
+# between its ends, so the values stay the exact sizes of the cuts in what
+# is left of the graph and no flow is ever recomputed.
+####################################################
+
+
+def gomory_hu(num_nodes, heads, tails):
+    '''
+        Builds a Gomory-Hu tree of a connected graph over the nodes 0..num_nodes-1
+
+        Inputs:
+            num_nodes - the number of nodes
+            heads, tails - integer arrays listing every edge once, without self loops
+
+        Outputs:
+            (parent, weight)
+            parent - parent[v] is the neighbor of v towards node 0 in the tree, -1 for node 0
+            weight - weight[v] is the size of the cut given by the tree edge (v, parent[v])
+    '''
+    rows = np.concatenate([heads, tails])
+    cols = np.concatenate([tails, heads])
+    capacity = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(num_nodes, num_nodes))
+    capacity.sum_duplicates()
+
+    parent = np.zeros(num_nodes, dtype=np.int64)
+    parent[0] = -1
+    weight = np.zeros(num_nodes, dtype=np.int64)
+    for source in range(1, num_nodes):
+        target = parent[source]
+        result = maximum_flow(capacity, source, target, method='dinic')
+        residual = capacity - result.flow
+        residual.data = (residual.data > 0).astype(np.int32)
+        residual.eliminate_zeros()
+        side = np.zeros(num_nodes, dtype=bool)
+        side[breadth_first_order(residual, source, directed=True, return_predecessors=False)] = True
+
+        weight[source] = result.flow_value
+        moved = side & (parent == target)
+        moved[source] = False
+        parent[moved] = source
+        if target != 0 and side[parent[target]]:
+            parent[source] = parent[target]
+            parent[target] = source
+            weight[source] = weight[target]
+            weight[target] = result.flow_value
+    return parent.tolist(), weight.tolist()
+
+
+class CutTree:
+    '''
+        Gomory-Hu trees of the components of a graph, split into more and more parts
+
+        Inputs:
+            graph - a networkx graph, only read when the trees are built
+    '''
+
+    def __init__(self, graph):
+        nodes = list(graph.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        self.nodes = nodes
+        self.adjacency = [set() for _ in nodes]
+        for u, v in graph.edges():
+            if u != v:
+                self.adjacency[index[u]].add(index[v])
+                self.adjacency[index[v]].add(index[u])
+
+        # every node has a parent in the forest unless it is the root of a part
+        self.parent = [-1] * len(nodes)
+        self.value = [0] * len(nodes)
+        self.depth = [0] * len(nodes)
+        self.children = [set() for _ in nodes]
+        self.roots = set()
+
+        heads = np.array([u for u in range(len(nodes)) for v in self.adjacency[u] if u < v], dtype=np.int64)
+        tails = np.array([v for u in range(len(nodes)) for v in self.adjacency[u] if u < v], dtype=np.int64)
+        adjacency = csr_matrix((np.ones(len(heads), dtype=np.int8), (heads, tails)), shape=(len(nodes), len(nodes)))
+        _, labels = connected_components(adjacency, directed=False)
+        for component in range(labels.max() + 1 if len(nodes) else 0):
+            members = np.flatnonzero(labels == component)
+            local = np.full(len(nodes), -1, dtype=np.int64)
+            local[members] = np.arange(len(members))
+            inside = labels[heads] == component
+            parent, weight = gomory_hu(len(members), local[heads[inside]], local[tails[inside]])
+            self.roots.add(int(members[0]))
+            for v in range(1, len(members)):
+                node, above = int(members[v]), int(members[parent[v]])
+                self.parent[node] = above
+                self.value[node] = weight[v]
+                self.children[above].add(node)
+            for node in self._subtree(int(members[0])):
+                for child in self.children[node]:
+                    self.depth[child] = self.depth[node] + 1
+
+    def num_parts(self):
+        return len(self.roots)
+
+    def parts(self):
+        '''
+            Returns the parts as sets of nodes of the graph
+        '''
+        return [set(self.nodes[v] for v in self._subtree(root)) for root in sorted(self.roots)]
+
+    def _subtree(self, node):
+        subtree = [node]
+        for v in subtree:
+            subtree.extend(self.children[v])
+        return subtree
+
+    def _cut_path(self, u, v):
+        '''
+            Lowers the value of every tree edge on the path between u and v by one
+        '''
+        depth, parent, value = self.depth, self.parent, self.value
+        while u != v:
+            if depth[u] < depth[v]:
+                u, v = v, u
+            value[u] -= 1
+            u = parent[u]
+
+    def split(self):
+        '''
+            Splits off a part along the lightest tree edge
+
+            Outputs:
+                the edges of the graph crossing the cut, which are removed from the parts
+        '''
+        candidates = [v for v in range(len(self.nodes)) if self.parent[v] != -1]
+        if not candidates:
+            raise Exception('no way to make new connected component')
+        node = min(candidates, key=lambda v: (self.value[v], v))
+
+        side = set(self._subtree(node))
+        crossing = [(u, v) for u in side for v in self.adjacency[u] if v not in side]
+        for u, v in crossing:
+            self.adjacency[u].discard(v)
+            self.adjacency[v].discard(u)
+            self._cut_path(u, v)
+
+        self.children[self.parent[node]].discard(node)
+        self.parent[node] = -1
+        self.roots.add(node)
+        return [(self.nodes[u], self.nodes[v]) for u, v in crossing]
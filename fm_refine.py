@@ -0,0 +1,341 @@
+import argparse
+import os
+
+from assignment_state import AssignmentState
+from batch import category_names, imap_jobs, load_category_instance
+from instance_cache import load_instance, write_output
+from output_scorer import assign_buses, read_output
+
+####################################################
+# Fiduccia-Mattheyses refinement of a finished bus assignment.
+#
+# A pass repeatedly moves the unlocked student whose best move keeps the
+# most friendships, kept in gain buckets, and locks them. When their best
+# bus is full they are swapped with the student of that bus who would
+# rather be on theirs. Moves which lose friendships are made too, so a pass
+# can climb out of a local optimum, and at the end of the pass every move
+# after the best assignment seen is undone. Scores are kept exactly like
+# score_output by an AssignmentState, rowdy groups included. Gains price
+# rowdy groups in as well: a bus where a student would complete one of
+# their rowdy groups is never their target, and students alone in a rowdy
+# group, who never count, are left out of every friend count.
+#
+# To run:
+#   python3 fm_refine.py <input_folder> <output_file> [<refined_file>]
+#   python3 fm_refine.py --category [--jobs N] <input_dir> <output_dir>
+#
+#   input_folder, output_file - an input and an output of it to refine
+#   refined_file - where to write the refined output, by default output_file
+#   input_dir, output_dir - a size category folder or pack and the folder of its outputs
+#
+# Outputs are only rewritten when refining improves them.
+#
+# Examples:
+#   python3 fm_refine.py ./all_inputs/small/12 ./all_outputs/small/12.out
+#   python3 fm_refine.py --category --jobs 8 ./all_inputs/large ./all_outputs/large
+####################################################
+
+FM_PASSES = 8
+
+# A pass stops after this many moves in a row which do not beat the best score of the pass
+PATIENCE = 50
+
+
+class GainBuckets:
+    '''
+        Students bucketed by the gain of their best move, so the best one is found without sorting.
+        Every bucket is a dict used as an ordered set, so students are added, removed and popped in O(1).
+    '''
+
+    def __init__(self):
+        self.buckets = {}
+        self.gain_of = {}
+        self.top = None
+
+    def insert(self, student, gain):
+        self.buckets.setdefault(gain, {})[student] = None
+        self.gain_of[student] = gain
+        if self.top is None or gain > self.top:
+            self.top = gain
+
+    def remove(self, student):
+        gain = self.gain_of.pop(student, None)
+        if gain is not None:
+            bucket = self.buckets[gain]
+            del bucket[student]
+            if not bucket:
+                del self.buckets[gain]
+
+    def pop(self):
+        '''
+            Removes and returns the student with the highest gain, the last filed on ties, or None
+        '''
+        if not self.buckets:
+            self.top = None
+            return None
+        while self.top not in self.buckets:
+            self.top -= 1
+        bucket = self.buckets[self.top]
+        student, _ = bucket.popitem()
+        if not bucket:
+            del self.buckets[self.top]
+        del self.gain_of[student]
+        return student
+
+
+def adjacency(state):
+    '''
+        Returns (neighbors, memberships, friends) for an AssignmentState:
+        neighbors[s] - the friends of s which count, without self loops and students alone in a rowdy group
+        memberships[s] - the rowdy groups of s which could be completed, those of two or more which fit on a bus
+        friends[s] - a dict from every bus to the number of neighbors of s on it
+    '''
+    num_students = len(state.bus_of)
+    groups = state.groups
+    lonely = [any(len(groups[g]) == 1 for g in state.memberships[s]) for s in range(num_students)]
+    neighbors = [[] if lonely[s] else [u for u in state.neighbors[s] if u != s and not lonely[u]]
+                 for s in range(num_students)]
+    memberships = [[g for g in state.memberships[s] if 1 < len(groups[g]) <= state.size_bus]
+                   for s in range(num_students)]
+    friends = []
+    for s in range(num_students):
+        counts = {}
+        for u in neighbors[s]:
+            counts[state.bus_of[u]] = counts.get(state.bus_of[u], 0) + 1
+        friends.append(counts)
+    return neighbors, memberships, friends
+
+
+def fm_pass(state, riders, neighbors, memberships, friends, patience=PATIENCE):
+    '''
+        Runs one pass over an AssignmentState and returns the number of friendships gained.
+        riders lists the students of every bus, and neighbors, memberships and friends are
+        those of adjacency, all kept in step with the state.
+    '''
+    num_students = len(state.bus_of)
+    bus_of = state.bus_of
+    sizes = state.sizes
+    groups = state.groups
+    occupancy = state.occupancy
+
+    targets = [None] * num_students
+    locked = [False] * num_students
+    buckets = GainBuckets()
+
+    def completes(s, bus, leaving=None):
+        '''
+            Checks whether moving s onto bus, while leaving moves off it, puts every student
+            of one of the rowdy groups of s on it
+        '''
+        for g in memberships[s]:
+            others = occupancy[g].get(bus, 0)
+            if leaving is not None and bus_of[leaving] == bus and g in state.memberships[leaving]:
+                others -= 1
+            if others == len(groups[g]) - 1:
+                return True
+        return False
+
+    def update(s):
+        '''
+            Files s under the gain of moving them to the bus they have the most friends on,
+            among those where they would not complete a rowdy group
+        '''
+        buckets.remove(s)
+        own = bus_of[s]
+        best = None
+        for bus, count in friends[s].items():
+            if bus != own and (best is None or (count, -bus) > (best[0], -best[1])) and not completes(s, bus):
+                best = (count, bus)
+        if best is None:
+            targets[s] = None
+            return
+        targets[s] = best[1]
+        buckets.insert(s, best[0] - friends[s].get(own, 0))
+
+    def shift(s, source, bus):
+        '''
+            Refiles s after one of their friends moved from source to bus
+        '''
+        target = targets[s]
+        if target is None or target == source:
+            update(s)
+            return
+        own = bus_of[s]
+        counts = friends[s]
+        if bus != own and (counts[bus], -bus) > (counts[target], -target) and not completes(s, bus):
+            target = bus
+            targets[s] = target
+        gain = counts[target] - counts.get(own, 0)
+        if buckets.gain_of[s] != gain:
+            buckets.remove(s)
+            buckets.insert(s, gain)
+
+    def move(s, bus):
+        '''
+            Moves s onto bus, keeping riders and the friends of their neighbors in step
+        '''
+        source = bus_of[s]
+        riders[source].remove(s)
+        riders[bus].add(s)
+        state.move(s, bus)
+        for u in neighbors[s]:
+            counts = friends[u]
+            if counts[source] == 1:
+                del counts[source]
+            else:
+                counts[source] -= 1
+            counts[bus] = counts.get(bus, 0) + 1
+        return source
+
+    def relocate(s, bus):
+        source = move(s, bus)
+        locked[s] = True
+        buckets.remove(s)
+        for u in neighbors[s]:
+            if not locked[u]:
+                shift(u, source, bus)
+        # the one student of a rowdy group of s left off bus would now complete it there,
+        # and the one left off source no longer would
+        for g in memberships[s]:
+            missing = len(groups[g]) - 1
+            for full in (bus, source):
+                if occupancy[g].get(full, 0) == missing - (full == source):
+                    for u in groups[g]:
+                        if bus_of[u] != full and not locked[u]:
+                            update(u)
+        return source
+
+    for s in range(num_students):
+        update(s)
+
+    start = best = state.kept
+    moves = []
+    best_moves = 0
+    since_best = 0
+    while since_best < patience:
+        s = buckets.pop()
+        if s is None:
+            break
+        source = bus_of[s]
+        target = targets[s]
+        if sizes[target] < state.size_bus:
+            if sizes[source] < 2:
+                locked[s] = True
+                continue
+            moves.append((s, relocate(s, target)))
+        else:
+            # swap with the student of the full bus gaining the most by coming over
+            adjacent = set(neighbors[s])
+            partner = None
+            for u in riders[target]:
+                if locked[u] or completes(u, source, s):
+                    continue
+                gain = friends[u].get(source, 0) - friends[u].get(target, 0) - (2 if u in adjacent else 0)
+                if partner is None or (gain, -u) > (partner[0], -partner[1]):
+                    partner = (gain, u)
+            if partner is None:
+                locked[s] = True
+                continue
+            moves.append((s, relocate(s, target)))
+            moves.append((partner[1], relocate(partner[1], source)))
+
+        if state.kept > best:
+            best = state.kept
+            best_moves = len(moves)
+            since_best = 0
+        else:
+            since_best += 1
+
+    for s, source in reversed(moves[best_moves:]):
+        move(s, source)
+    return best - start
+
+
+def refine(instance, buses, passes=FM_PASSES):
+    '''
+        Improves a bus assignment with Fiduccia-Mattheyses passes
+
+        Inputs:
+            instance - an instance_cache.Instance
+            buses - a valid assignment, a list of buses each a list of students 0..n-1
+            passes - the most passes to run, refining stops early once a pass gains nothing
+
+        Outputs:
+            the refined assignment, which keeps at least as many friendships and is still valid
+    '''
+    if not len(instance.edges):
+        return [list(bus) for bus in buses]
+    state = AssignmentState(instance, buses)
+    riders = [set(bus) for bus in buses]
+    neighbors, memberships, friends = adjacency(state)
+    for _ in range(passes):
+        if fm_pass(state, riders, neighbors, memberships, friends) <= 0:
+            break
+    return state.solution()
+
+
+def refine_output(instance, output_file, refined_file=None):
+    '''
+        Refines an output file of an Instance, writing the result to refined_file (by default
+        output_file) if it keeps more friendships
+
+        Outputs:
+            (score_before, score, msg)
+            score_before, score - the score of the output before and after refining, -1 if it is not valid
+            msg - a string which stores error messages in case the output file is not valid
+    '''
+    labels = instance.labels.tolist()
+    index = {student: i for i, student in enumerate(labels)}
+    bus_assignments, msg = assign_buses(index, instance.num_buses, instance.size_bus, read_output(output_file))
+    if bus_assignments is None:
+        return -1, -1, msg
+
+    buses = [[] for _ in range(instance.num_buses)]
+    for student, bus in enumerate(bus_assignments):
+        buses[bus].append(student)
+    state = AssignmentState(instance, buses)
+    before = state.score()
+    refined = refine(instance, buses)
+    after = AssignmentState(instance, refined).score()
+    if after > before:
+        write_output(refined_file or output_file, refined, labels)
+    elif refined_file:
+        write_output(refined_file, buses, labels)
+    return before, after, "Refined from {} to {}".format(before, after)
+
+
+def refine_instance(task):
+    '''
+        Refines one output of a batch, task is (input_dir, output_dir, input_name)
+    '''
+    input_dir, output_dir, input_name = task
+    output_file = output_dir + '/' + input_name + '.out'
+    if not os.path.isfile(output_file):
+        return -1, -1, "No output for {}".format(input_name)
+    try:
+        instance = load_category_instance(input_dir, input_name)
+        before, after, msg = refine_output(instance, output_file)
+    except (OSError, ValueError) as e:
+        return -1, -1, "Could not refine {}: {}".format(input_name, e)
+    return before, after, "{}: {}".format(input_name, msg)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refines outputs with Fiduccia-Mattheyses passes')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('refined', nargs='?')
+    parser.add_argument('--category', action='store_true')
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.category:
+        before, after, msg = refine_output(load_instance(args.input), args.output, args.refined)
+        print(msg)
+    else:
+        improved = 0
+        tasks = [(args.input, args.output, input_name) for input_name in category_names(args.input)]
+        for before, after, msg in imap_jobs(refine_instance, tasks, args.jobs):
+            improved += 1 if after > before else 0
+            print(msg)
+        print('improved', improved)
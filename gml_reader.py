@@ -0,0 +1,172 @@
+import html
+import mmap
+import re
+
+import numpy as np
+
+####################################################
+# Streaming GML reader for the input graphs.
+#
+# Reads the node and edge blocks of a graph.gml straight into a list of
+# labels and an (E, 2) int32 edge array whose entries are positions in
+# that list (i.e. students relabeled to 0..n-1 in file order), without
+# building a networkx graph.
+####################################################
+
+GRAPH_RE = re.compile(rb'\bgraph\s*\[')
+
+# the layout written by nx.write_gml: id/label first in every node block and
+# source/target first in every edge block. Anything after them is ignored.
+# Blocks which do not start that way match the last alternative.
+LAYOUT_RE = re.compile(rb'\b(?:node\s*\[\s*id\s+(-?\d+)\s+label\s+"([^"]*)"'
+                       rb'|edge\s*\[\s*source\s+(-?\d+)\s+target\s+(-?\d+)'
+                       rb'|(node|edge)\s*\[)')
+
+TOKEN_RE = re.compile(rb'\[|\]|"[^"]*"|#[^\n]*|[^\s\[\]"]+')
+
+
+def _integers(values):
+    '''
+        Returns a list of integer tokens as an int64 array
+    '''
+    try:
+        return np.array(values, dtype=bytes).astype(np.int64)
+    except ValueError:
+        raise ValueError("node ids and edge endpoints must be integers")
+
+
+def _column(values):
+    '''
+        Returns the integers of one column of LAYOUT_RE matches, skipping the
+        blocks it is empty for, as an int64 array
+    '''
+    # splitting on whitespace drops the empty entries
+    return _integers(b' '.join(values).split())
+
+
+def _read_fast(data):
+    '''
+        Matches the nx.write_gml layout in one pass over data. Returns None if
+        any node or edge block does not follow it so the caller can fall back
+        to tokenizing.
+    '''
+    matches = LAYOUT_RE.findall(data)
+    if not matches:
+        return np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64)
+    ids, labels, sources, targets, others = zip(*matches)
+    if any(others):
+        return None
+    # labels may be empty, ids never are
+    labels = [label for node_id, label in zip(ids, labels) if node_id]
+    ends = np.stack((_column(sources), _column(targets)), axis=1).ravel()
+    return _column(ids), labels, ends
+
+
+def _read_tokens(data):
+    '''
+        General GML tokenizer. Keeps the first value of every top level
+        attribute of the node and edge blocks and skips nested lists.
+        Returns the node ids and edge endpoints as int64 arrays.
+    '''
+    ids, labels, ends = [], [], []
+    stack = []
+    key = None
+    for match in TOKEN_RE.finditer(data):
+        token = match.group(0)
+        if token[:1] == b'#':
+            continue
+        if token == b'[':
+            block = {} if len(stack) == 1 and key in (b'node', b'edge') else None
+            stack.append((key, block))
+            key = None
+        elif token == b']':
+            if not stack:
+                raise ValueError("unbalanced ']' in GML")
+            name, block = stack.pop()
+            if block is None:
+                continue
+            if name == b'node':
+                if b'id' not in block:
+                    raise ValueError("node #{} has no 'id' attribute".format(len(ids)))
+                if b'label' not in block:
+                    raise ValueError("node #{} has no 'label' attribute".format(len(ids)))
+                ids.append(block[b'id'])
+                labels.append(block[b'label'].strip(b'"'))
+            else:
+                for attr in (b'source', b'target'):
+                    if attr not in block:
+                        raise ValueError("edge #{} has no '{}' attribute".format(len(ends) // 2, attr.decode()))
+                    ends.append(block[attr])
+        elif key is None:
+            key = token
+        else:
+            if stack and stack[-1][1] is not None:
+                stack[-1][1].setdefault(key, token)
+            key = None
+    if stack:
+        raise ValueError("unbalanced '[' in GML")
+    return _integers(ids), labels, _integers(ends)
+
+
+def parse_gml(data):
+    '''
+        Parses the contents of a graph.gml
+
+        Inputs:
+            data - a bytes-like object (bytes or mmap) holding the GML text
+
+        Outputs:
+            (labels, edges)
+            labels - a list of the node labels in file order
+            edges - an (E, 2) int32 array of positions into labels
+    '''
+    if not GRAPH_RE.search(data):
+        raise ValueError("input contains no graph")
+    parsed = _read_fast(data)
+    if parsed is None:
+        parsed = _read_tokens(data)
+    ids, labels, ends = parsed
+    num_nodes = len(ids)
+
+    # map GML ids to positions in file order
+    if np.array_equal(ids, np.arange(num_nodes)):
+        positions = ends
+    else:
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        if num_nodes and np.any(sorted_ids[1:] == sorted_ids[:-1]):
+            raise ValueError("node id is duplicated")
+        found = np.searchsorted(sorted_ids, ends).clip(max=max(num_nodes - 1, 0))
+        if len(ends) and (not num_nodes or np.any(sorted_ids[found] != ends)):
+            raise ValueError("edge has undefined endpoint")
+        positions = order[found] if num_nodes else ends
+    if len(positions) and (positions.min() < 0 or positions.max() >= num_nodes):
+        raise ValueError("edge has undefined endpoint")
+    edges = positions.astype(np.int32).reshape(-1, 2)
+
+    # a simple graph may not list the same friendship twice
+    low = np.minimum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    high = np.maximum(edges[:, 0], edges[:, 1]).astype(np.int64)
+    if len(np.unique(low * num_nodes + high)) != len(edges):
+        raise ValueError("edge is duplicated")
+
+    labels = [html.unescape(label.decode()) if b'&' in label else label.decode() for label in labels]
+    if len(set(labels)) != num_nodes:
+        raise ValueError("node label is duplicated")
+    return labels, edges
+
+
+def read_gml(path):
+    '''
+        Reads a graph.gml through a memory map, see parse_gml
+    '''
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return parse_gml(b'')
+        try:
+            return parse_gml(data)
+        finally:
+            data.close()
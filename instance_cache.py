@@ -0,0 +1,311 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+import networkx as nx
+import numpy as np
+
+from gml_reader import parse_gml
+from parameters_reader import parse_parameters
+
+###########################################
+# Change this variable if you want the
+# compiled instances to be stored in a
+# different folder
+###########################################
+path_to_cache = "./.instance_cache"
+
+# bump this whenever the layout of the compiled arrays changes
+CACHE_VERSION = 2
+
+SOURCE_FILES = ("graph.gml", "parameters.txt")
+
+# A compiled instance. Students are relabeled to 0..n-1 in the order they
+# appear in graph.gml; labels[i] is the original label of student i.
+#   edges         - (E, 2) int32 array, one row per friendship
+#   indptr/indices - CSR adjacency, neighbors of i are indices[indptr[i]:indptr[i + 1]]
+#   rowdy_ptr/rowdy_members - CSR rowdy groups, members of group g are
+#                  rowdy_members[rowdy_ptr[g]:rowdy_ptr[g + 1]]
+#   member_ptr/member_groups - CSR memberships, the rowdy groups containing
+#                  student i are member_groups[member_ptr[i]:member_ptr[i + 1]]
+Instance = collections.namedtuple("Instance", [
+    "labels", "edges", "indptr", "indices",
+    "num_buses", "size_bus", "rowdy_ptr", "rowdy_members",
+    "member_ptr", "member_groups",
+])
+
+
+def build_csr(num_nodes, edges):
+    '''
+        Builds a CSR adjacency from an (E, 2) edge array. A self loop shows
+        up once in its node's neighbor list, like in networkx.
+    '''
+    if len(edges):
+        loops = edges[:, 0] == edges[:, 1]
+        heads = np.concatenate([edges[:, 0], edges[~loops, 1]])
+        tails = np.concatenate([edges[:, 1], edges[~loops, 0]])
+    else:
+        heads = tails = np.zeros(0, dtype=np.int32)
+    order = np.lexsort((tails, heads))
+    indices = tails[order].astype(np.int32)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=num_nodes), out=indptr[1:])
+    return indptr, indices
+
+
+def csr_ranges(starts, lengths):
+    '''
+        Concatenates the index ranges starts[i]:starts[i] + lengths[i], e.g. the CSR rows
+        of several nodes with starts = indptr[nodes] and lengths = their degrees
+    '''
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def compile_instance(graph_data, parameters_text):
+    '''
+        Compiles the contents of graph.gml (bytes) and parameters.txt into an Instance
+    '''
+    labels, edges = parse_gml(graph_data)
+    index = {label: i for i, label in enumerate(labels)}
+    indptr, indices = build_csr(len(labels), edges)
+
+    num_buses, size_bus, constraints, memberships = parse_parameters(parameters_text)
+    for student in memberships:
+        if student not in index:
+            raise ValueError("rowdy group {} references a non-existant student: {}".format(memberships[student][0], student))
+    rowdy_ptr = np.zeros(len(constraints) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in constraints], out=rowdy_ptr[1:])
+    rowdy_members = np.array([index[s] for c in constraints for s in c], dtype=np.int32)
+
+    member_ptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    member_groups = [memberships.get(label, []) for label in labels]
+    np.cumsum([len(groups) for groups in member_groups], out=member_ptr[1:])
+    member_groups = np.array([g for groups in member_groups for g in groups], dtype=np.int32)
+
+    return Instance(np.array(labels, dtype=str), edges, indptr, indices,
+                    num_buses, size_bus, rowdy_ptr, rowdy_members,
+                    member_ptr, member_groups)
+
+
+def _cache_path(folder_name):
+    key = hashlib.sha1(os.path.abspath(folder_name).encode()).hexdigest()
+    return os.path.join(path_to_cache, key + ".npz")
+
+
+def _read_source(folder_name, file_name):
+    path = os.path.join(folder_name, file_name)
+    with open(path, "rb") as f:
+        data = f.read()
+    st = os.stat(path)
+    return data, [st.st_size, st.st_mtime_ns, hashlib.sha1(data).hexdigest()]
+
+
+def _save(cache_path, instance, stamps):
+    if not os.path.isdir(path_to_cache):
+        os.makedirs(path_to_cache, exist_ok=True)
+    arrays = instance._asdict()
+    arrays["stamps"] = np.array(json.dumps({"version": CACHE_VERSION, "files": stamps}))
+    # write to a temporary file first so parallel workers never see half a cache entry
+    fd, tmp_path = tempfile.mkstemp(dir=path_to_cache, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def _load(cache_path):
+    with np.load(cache_path) as data:
+        stamps = json.loads(str(data["stamps"]))
+        fields = {name: data[name] for name in Instance._fields}
+    fields["num_buses"] = int(fields["num_buses"])
+    fields["size_bus"] = int(fields["size_bus"])
+    return Instance(**fields), stamps
+
+
+def _is_fresh(folder_name, stamps):
+    '''
+        Checks the cached stamps against the source files. Returns (fresh, touched)
+        where touched is set if only the mtimes changed and the stamps need rewriting.
+    '''
+    if stamps.get("version") != CACHE_VERSION:
+        return False, False
+    touched = False
+    for file_name in SOURCE_FILES:
+        size, mtime, digest = stamps["files"][file_name]
+        st = os.stat(os.path.join(folder_name, file_name))
+        if st.st_size != size:
+            return False, False
+        if st.st_mtime_ns != mtime:
+            _, stamp = _read_source(folder_name, file_name)
+            if stamp[2] != digest:
+                return False, False
+            stamps["files"][file_name] = stamp
+            touched = True
+    return True, touched
+
+
+def load_instance(folder_name):
+    '''
+        Loads the compiled form of an input folder, compiling it on the first use
+
+        Inputs:
+            folder_name - a string representing the path to the input folder
+
+        Outputs:
+            an Instance; the cache entry is rebuilt whenever graph.gml or
+            parameters.txt change size, mtime and contents
+    '''
+    cache_path = _cache_path(folder_name)
+    if os.path.exists(cache_path):
+        try:
+            instance, stamps = _load(cache_path)
+        except (OSError, ValueError, KeyError):
+            instance, stamps = None, None
+        if instance is not None:
+            fresh, touched = _is_fresh(folder_name, stamps)
+            if fresh:
+                if touched:
+                    _save(cache_path, instance, stamps["files"])
+                return instance
+
+    graph_data, graph_stamp = _read_source(folder_name, "graph.gml")
+    parameters_data, parameters_stamp = _read_source(folder_name, "parameters.txt")
+    instance = compile_instance(graph_data, parameters_data.decode())
+    _save(cache_path, instance, {"graph.gml": graph_stamp, "parameters.txt": parameters_stamp})
+    return instance
+
+
+def to_graph(instance):
+    '''
+        Builds the NetworkX graph of an Instance over the students 0..n-1 and its
+        rowdy groups as lists of students. The original labels are kept in
+        graph.graph["labels"] and the Instance itself, for array based code, in
+        graph.graph["instance"].
+    '''
+    graph = nx.Graph(labels=instance.labels.tolist(), instance=instance)
+    graph.add_nodes_from(range(len(instance.labels)))
+    graph.add_edges_from(instance.edges.tolist())
+    return graph, rowdy_groups(instance)
+
+
+def graph_instance(graph, num_buses, size_bus, constraints):
+    '''
+        Returns the Instance behind a graph from parse_input, or compiles one from a
+        NetworkX graph over the students 0..n-1 and its rowdy groups
+    '''
+    instance = graph.graph.get("instance")
+    if instance is not None:
+        return instance
+
+    num_students = graph.number_of_nodes()
+    if set(graph.nodes()) != set(range(num_students)):
+        raise ValueError("the graph must be over the students 0..n-1, see parse_input")
+    edges = np.array(list(graph.edges()), dtype=np.int32).reshape(-1, 2)
+    indptr, indices = build_csr(num_students, edges)
+
+    rowdy_ptr = np.zeros(len(constraints) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in constraints], out=rowdy_ptr[1:])
+    rowdy_members = np.array([s for c in constraints for s in c], dtype=np.int32)
+
+    memberships = [[] for _ in range(num_students)]
+    for g, constraint in enumerate(constraints):
+        for student in set(constraint):
+            memberships[student].append(g)
+    member_ptr = np.zeros(num_students + 1, dtype=np.int64)
+    np.cumsum([len(groups) for groups in memberships], out=member_ptr[1:])
+    member_groups = np.array([g for groups in memberships for g in groups], dtype=np.int32)
+
+    labels = np.array(graph.graph.get("labels", [str(s) for s in range(num_students)]), dtype=str)
+    return Instance(labels, edges, indptr, indices, num_buses, size_bus,
+                    rowdy_ptr, rowdy_members, member_ptr, member_groups)
+
+
+def to_input(instance):
+    '''
+        Returns an Instance in the form of output_scorer.read_input
+    '''
+    labels = instance.labels.tolist()
+    return labels, instance.edges, instance.num_buses, instance.size_bus, rowdy_groups(instance, labels)
+
+
+def rowdy_groups(instance, labels=None):
+    '''
+        Returns the rowdy groups of an Instance as lists of students, using labels[s] for student s if given
+    '''
+    constraints = []
+    members = instance.rowdy_members.tolist()
+    if labels is not None:
+        members = [labels[s] for s in members]
+    ptr = instance.rowdy_ptr.tolist()
+    for g in range(len(ptr) - 1):
+        constraints.append(members[ptr[g]:ptr[g + 1]])
+    return constraints
+
+
+def shared_groups(instance):
+    '''
+        Returns the rowdy groups of two or more students of an Instance, the only ones which
+        can be broken up, renumbered 0..G-1 in order, from its membership CSR
+
+        Outputs:
+            (group_ptr, group_members, member_ptr, member_groups, lonely)
+            group_ptr, group_members - the students of group g are group_members[group_ptr[g]:group_ptr[g + 1]], in order
+            member_ptr, member_groups - the groups of student s are member_groups[member_ptr[s]:member_ptr[s + 1]], in order
+            lonely - a boolean array which is True for the students alone in some rowdy group
+    '''
+    num_students = len(instance.labels)
+    sizes = np.bincount(instance.member_groups, minlength=len(instance.rowdy_ptr) - 1)
+    shared = sizes > 1
+    student_of = np.repeat(np.arange(num_students), np.diff(instance.member_ptr))
+
+    lonely = np.zeros(num_students, dtype=bool)
+    lonely[student_of[sizes[instance.member_groups] == 1]] = True
+
+    kept = shared[instance.member_groups]
+    member_groups = (np.cumsum(shared) - 1)[instance.member_groups[kept]]
+    member_ptr = np.zeros(num_students + 1, dtype=np.int64)
+    np.cumsum(np.bincount(student_of[kept], minlength=num_students), out=member_ptr[1:])
+
+    # a stable sort keeps the students of every group in order
+    group_members = student_of[kept][np.argsort(member_groups, kind='stable')]
+    group_ptr = np.zeros(np.count_nonzero(shared) + 1, dtype=np.int64)
+    np.cumsum(sizes[shared], out=group_ptr[1:])
+    return group_ptr, group_members, member_ptr, member_groups, lonely
+
+
+def parse_input(folder_name):
+    '''
+        Parses an input and returns the corresponding graph and parameters
+
+        Inputs:
+            folder_name - a string representing the path to the input folder
+
+        Outputs:
+            (graph, num_buses, size_bus, constraints)
+            graph - the graph as a NetworkX object over the students 0..n-1, see to_graph
+            num_buses - an integer representing the number of buses you can allocate to
+            size_buses - an integer representing the number of students that can fit on a bus
+            constraints - a list where each element is a list vertices which represents a single rowdy group
+    '''
+    instance = load_instance(folder_name)
+    graph, constraints = to_graph(instance)
+    return graph, instance.num_buses, instance.size_bus, constraints
+
+
+def write_output(output_path, solution, labels):
+    '''
+        Writes a solution as an .out file
+
+        Inputs:
+            output_path - a string representing the path to the output file
+            solution - a list of buses, each a list of students 0..n-1
+            labels - the original label of every student, e.g. graph.graph["labels"]
+    '''
+    # write to a temporary file first so a killed run never leaves half an output
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as output_file:
+        for bus in solution:
+            output_file.write(str([labels[student] for student in bus]) + '\n')
+    os.replace(tmp_path, output_path)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+####################################################
+# Records what produced every output of a batch run, so that the next run
+# only solves the inputs whose output could be out of date.
+#
+# For every input the manifest keeps a hash of its contents, a hash of the
+# solver (its source files and settings), a hash of the output written for
+# it and the output's score. An input is solved again when there is no
+# entry for it, when it or its output changed since, or when the solver
+# changed and the recorded score still leaves room for min_gain.
+####################################################
+
+MANIFEST_NAME = "manifest.json"
+
+
+def instance_hash(instance):
+    '''
+        Returns a hash of the contents of an instance_cache.Instance
+    '''
+    digest = hashlib.sha1()
+    for field in instance:
+        if hasattr(field, "tobytes"):
+            digest.update(str(field.dtype).encode())
+            digest.update(field.tobytes())
+        else:
+            digest.update(str(field).encode())
+    return digest.hexdigest()
+
+
+def solver_hash(source_files, settings=None):
+    '''
+        Returns a hash of the solver source files and a dict of its settings
+    '''
+    digest = hashlib.sha1()
+    for path in source_files:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps(settings or {}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def local_modules(directory):
+    '''
+        Returns the loaded modules whose source file is in directory, sorted by file name.
+        Called once a solver is imported, these are the files it is made of.
+    '''
+    modules = {}
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and path.endswith(".py") and os.path.dirname(os.path.abspath(path)) == os.path.abspath(directory):
+            modules[os.path.abspath(path)] = module
+    return [modules[path] for path in sorted(modules)]
+
+
+def solver_settings(modules):
+    '''
+        Returns the settings of a solver made of modules: the upper case constants of every
+        module which JSON can hold, as they are when called, and the versions of the libraries
+        it loaded
+    '''
+    settings = {}
+    for module in modules:
+        for name, value in vars(module).items():
+            if not name.isupper():
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            settings[os.path.basename(module.__file__) + ":" + name] = value
+    for library in ("networkx", "numpy", "scipy"):
+        if library in sys.modules:
+            settings[library] = sys.modules[library].__version__
+    return settings
+
+
+def file_hash(path):
+    '''
+        Returns a hash of the contents of a file, or None if it cannot be read
+    '''
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class Manifest:
+    '''
+        The manifest of an output folder, stored as MANIFEST_NAME in it
+
+        Inputs:
+            output_dir - the folder holding the outputs
+    '''
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def stale(self, input_name, input_digest, solver_digest, output_path, min_gain=0):
+        '''
+            Returns why an input needs solving again, or None if its output is up to date
+        '''
+        entry = self.entries.get(input_name)
+        if entry is None:
+            return "not solved yet"
+        if entry["input"] != input_digest:
+            return "input changed"
+        if entry["output"] is None or file_hash(output_path) != entry["output"]:
+            return "output changed"
+        if entry["solver"] != solver_digest and entry["score"] < 1 - min_gain:
+            return "solver changed"
+        return None
+
+    def score(self, input_name, input_digest, output_path):
+        '''
+            Returns the recorded score of the output of an input, or None if the output is not
+            the one recorded for the current contents of the input
+        '''
+        entry = self.entries.get(input_name)
+        if entry is None or entry["input"] != input_digest or entry["output"] is None:
+            return None
+        if file_hash(output_path) != entry["output"]:
+            return None
+        return entry["score"]
+
+    def record(self, input_name, input_digest, solver_digest, output_path, score):
+        self.entries[input_name] = {
+            "input": input_digest,
+            "solver": solver_digest,
+            "output": file_hash(output_path),
+            "score": score,
+        }
+
+    def save(self):
+        '''
+            Writes the manifest, through a temporary file so a killed run never leaves half of it
+        '''
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -1,7 +1,11 @@
 import os
 import sys
-import networkx as nx
-import matplotlib.pyplot as plt
+
+import numpy as np
+
+from gml_reader import read_gml
+from parameters_reader import read_parameters
+from scoring import score_kernel
 
 ####################################################
 # To run:
@@ -14,90 +18,145 @@ import matplotlib.pyplot as plt
 #   python3 output_scorer.py ./inputs/small/12 ./outputs/small/12.out
 ####################################################
 
-def score_output(input_folder, output_file):
+def read_input(input_folder):
     '''
-        Takes an input and an output and returns the score of the output on that input if valid
-        
+        Reads an input folder without building a NetworkX graph
+
         Inputs:
             input_folder - a string representing the path to the input folder
-            output_file - a string representing the path to the output file
 
         Outputs:
-            (score, msg)
-            score - a number between 0 and 1 which represents what fraction of friendships were broken
-            msg - a string which stores error messages in case the output file is not valid for the given input
+            (labels, edges, num_buses, size_bus, constraints)
+            labels - a list of the students in the order they appear in graph.gml
+            edges - an (E, 2) array of friendships as positions into labels
+            num_buses, size_bus, constraints - as in parse_input
     '''
-    graph = nx.read_gml(input_folder + "/graph.gml")
-    parameters = open(input_folder + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
+    labels, edges = read_gml(input_folder + "/graph.gml")
+    num_buses, size_bus, constraints, _ = read_parameters(input_folder + "/parameters.txt")
 
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [node.replace("'","") for node in line.split(", ")]
-        constraints.append(curr_constraint)
+    return labels, edges, num_buses, size_bus, constraints
 
+def read_output(output_file):
     output = open(output_file)
     assignments = []
     for line in output:
         line = line[1: -2]
         curr_assignment = [node.replace("'","") for node in line.split(", ")]
         assignments.append(curr_assignment)
+    output.close()
+    return assignments
+
+def assign_buses(index, num_buses, size_bus, assignments):
+    '''
+        Checks that the assignments are a valid output
 
+        Inputs:
+            index - a dict from student label to position
+            num_buses, size_bus - the parameters of the input
+            assignments - the buses read by read_output
+
+        Outputs:
+            (bus_assignments, msg)
+            bus_assignments - a list holding the bus of every student, or None if the output is not valid
+            msg - the reason the output is not valid
+    '''
     if len(assignments) != num_buses:
-        return -1, "Must assign students to exactly {} buses, found {} buses".format(num_buses, len(assignments))
-    
+        return None, "Must assign students to exactly {} buses, found {} buses".format(num_buses, len(assignments))
+
     # make sure no bus is empty or above capacity
     for i in range(len(assignments)):
         if len(assignments[i]) > size_bus:
-            return -1, "Bus {} is above capacity".format(i)
+            return None, "Bus {} is above capacity".format(i)
         if len(assignments[i]) <= 0:
-            return -1, "Bus {} is empty".format(i)
-        
-    bus_assignments = {}
-    attendance_count = 0
-        
+            return None, "Bus {} is empty".format(i)
+
     # make sure each student is in exactly one bus
-    attendance = {student:False for student in graph.nodes()}
+    bus_assignments = [None] * len(index)
     for i in range(len(assignments)):
-        if not all([student in graph for student in assignments[i]]):
-            return -1, "Bus {} references a non-existant student: {}".format(i, assignments[i])
+        if not all([student in index for student in assignments[i]]):
+            return None, "Bus {} references a non-existant student: {}".format(i, assignments[i])
 
         for student in assignments[i]:
             # if a student appears more than once
-            if attendance[student] == True:
+            if bus_assignments[index[student]] is not None:
                 print(assignments[i])
-                return -1, "{0} appears more than once in the bus assignments".format(student)
-                
-            attendance[student] = True
-            bus_assignments[student] = i
-    
+                return None, "{0} appears more than once in the bus assignments".format(student)
+
+            bus_assignments[index[student]] = i
+
     # make sure each student is accounted for
-    if not all(attendance.values()):
-        return -1, "Not all students have been assigned a bus"
-    
-    total_edges = graph.number_of_edges()
-    # Remove nodes for rowdy groups which were not broken up
-    for i in range(len(constraints)):
-        busses = set()
-        for student in constraints[i]:
-            busses.add(bus_assignments[student])
-        if len(busses) <= 1:
-            for student in constraints[i]:
-                if student in graph:
-                    graph.remove_node(student)
-
-    # score output
-    score = 0
-    for edge in graph.edges():
-        if bus_assignments[edge[0]] == bus_assignments[edge[1]]:
-            score += 1
+    if None in bus_assignments:
+        return None, "Not all students have been assigned a bus"
+
+    return bus_assignments, None
+
+def rowdy_arrays(index, constraints):
+    '''
+        Returns the rowdy groups as the (rowdy_ptr, rowdy_members) arrays of the scoring kernel
+    '''
+    rowdy_ptr = np.zeros(len(constraints) + 1, dtype=np.int64)
+    np.cumsum([len(constraint) for constraint in constraints], out=rowdy_ptr[1:])
+    rowdy_members = np.array([index[student] for constraint in constraints for student in constraint], dtype=np.int64)
+    return rowdy_ptr, rowdy_members
+
+def rowdy_buses(bus_assignments, unbroken, rowdy_ptr, rowdy_members):
+    '''
+        Returns the bus of every rowdy group which was not broken up, in group order
+    '''
+    first_members = rowdy_members[rowdy_ptr[:-1][unbroken]]
+    return np.asarray(bus_assignments)[first_members].tolist()
+
+def score_output(input_folder, output_file, parsed_input=None):
+    '''
+        Takes an input and an output and returns the score of the output on that input if valid
+
+        Inputs:
+            input_folder - a string representing the path to the input folder
+            output_file - a string representing the path to the output file
+            parsed_input - the result of read_input for input_folder if it was already read, e.g. from a pack
+
+        Outputs:
+            (score, msg)
+            score - a number between 0 and 1 which represents what fraction of friendships were broken
+            msg - a string which stores error messages in case the output file is not valid for the given input
+    '''
+    if parsed_input is None:
+        parsed_input = read_input(input_folder)
+    labels, edges, num_buses, size_bus, constraints = parsed_input
+    index = {student: i for i, student in enumerate(labels)}
+
+    assignments = read_output(output_file)
+    bus_assignments, msg = assign_buses(index, num_buses, size_bus, assignments)
+    if bus_assignments is None:
+        return -1, msg
+
+    total_edges = len(edges)
+    # score output, without the students of rowdy groups which were not broken up
+    rowdy_ptr, rowdy_members = rowdy_arrays(index, constraints)
+    _, score, _ = score_kernel(bus_assignments, edges, rowdy_ptr, rowdy_members)
     score = score / total_edges
 
 
     return score, "Valid output submitted with score: {}".format(score)
 
+def output_score(instance, output_path):
+    '''
+        Returns the score of an output file of an instance_cache.Instance, or -1 if it
+        is missing or not valid
+    '''
+    try:
+        assignments = read_output(output_path)
+    except OSError:
+        return -1
+    index = {student: i for i, student in enumerate(instance.labels.tolist())}
+    bus_of, _ = assign_buses(index, instance.num_buses, instance.size_bus, assignments)
+    if bus_of is None:
+        return -1
+    if not len(instance.edges):
+        return 0
+    _, kept, _ = score_kernel(np.array(bus_of), instance.edges, instance.rowdy_ptr, instance.rowdy_members)
+    return kept / len(instance.edges)
+
 if __name__ == '__main__':
     score, msg = score_output(sys.argv[1], sys.argv[2])
     print(msg)
\ No newline at end of file
@@ -1,7 +1,8 @@
 import os
 import sys
-import networkx as nx
-import matplotlib.pyplot as plt
+
+from output_scorer import read_input, read_output, assign_buses, rowdy_arrays, rowdy_buses
+from scoring import score_kernel
 
 ####################################################
 # To run:
@@ -14,93 +15,40 @@ import matplotlib.pyplot as plt
 #   python3 output_scorer.py ./inputs/small/12 ./outputs/small/12.out
 ####################################################
 
-def score_output(input_folder, output_file):
+def score_output(input_folder, output_file, parsed_input=None):
     '''
         Takes an input and an output and returns the score of the output on that input if valid
 
         Inputs:
             input_folder - a string representing the path to the input folder
             output_file - a string representing the path to the output file
+            parsed_input - the result of read_input for input_folder if it was already read, e.g. from a pack
 
         Outputs:
             (score, msg)
             score - a number between 0 and 1 which represents what fraction of friendships were broken
             msg - a string which stores error messages in case the output file is not valid for the given input
     '''
-    graph = nx.read_gml(input_folder + "/graph.gml")
-    parameters = open(input_folder + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [node.replace("'","") for node in line.split(", ")]
-        constraints.append(curr_constraint)
-
-    output = open(output_file)
-    assignments = []
-    for line in output:
-        line = line[1: -2]
-        curr_assignment = [node.replace("'","") for node in line.split(", ")]
-        assignments.append(curr_assignment)
-
-    if len(assignments) != num_buses:
-        return -1, "Must assign students to exactly {} buses, found {} buses".format(num_buses, len(assignments))
-
-    # make sure no bus is empty or above capacity
-    for i in range(len(assignments)):
-        if len(assignments[i]) > size_bus:
-            return -1, "Bus {} is above capacity".format(i)
-        if len(assignments[i]) <= 0:
-            return -1, "Bus {} is empty".format(i)
-
-    bus_assignments = {}
-    attendance_count = 0
-
-    # make sure each student is in exactly one bus
-    attendance = {student:False for student in graph.nodes()}
-    for i in range(len(assignments)):
-        if not all([student in graph for student in assignments[i]]):
-            return -1, "Bus {} references a non-existant student: {}".format(i, assignments[i])
-
-        for student in assignments[i]:
-            # if a student appears more than once
-            if attendance[student] == True:
-                print(assignments[i])
-                return -1, "{0} appears more than once in the bus assignments".format(student)
-
-            attendance[student] = True
-            bus_assignments[student] = i
-
-    # make sure each student is accounted for
-    if not all(attendance.values()):
-        return -1, "Not all students have been assigned a bus"
-
-    total_edges = graph.number_of_edges()
-    # Remove nodes for rowdy groups which were not broken up
-    num_rowdy = 0
-    rowdy_buses = []
-    for i in range(len(constraints)):
-        busses = set()
-        for student in constraints[i]:
-            busses.add(bus_assignments[student])
-        if len(busses) <= 1:
-            num_rowdy += 1
-            rowdy_buses.append(busses[0])
-            for student in constraints[i]:
-                if student in graph:
-                    graph.remove_node(student)
-
-    # score output
-    score = 0
-    for edge in graph.edges():
-        if bus_assignments[edge[0]] == bus_assignments[edge[1]]:
-            score += 1
+    if parsed_input is None:
+        parsed_input = read_input(input_folder)
+    labels, edges, num_buses, size_bus, constraints = parsed_input
+    index = {student: i for i, student in enumerate(labels)}
+
+    assignments = read_output(output_file)
+    bus_assignments, msg = assign_buses(index, num_buses, size_bus, assignments)
+    if bus_assignments is None:
+        return -1, msg
+
+    total_edges = len(edges)
+    # score output, without the students of rowdy groups which were not broken up
+    rowdy_ptr, rowdy_members = rowdy_arrays(index, constraints)
+    _, score, unbroken = score_kernel(bus_assignments, edges, rowdy_ptr, rowdy_members)
     score = score / total_edges
+    buses = rowdy_buses(bus_assignments, unbroken, rowdy_ptr, rowdy_members)
+    num_rowdy = len(buses)
 
 
-    return score, "Valid output submitted with score: {0}, with {1} rowdy groups in buses {2}".format(score, num_rowdy, rowdy_buses)
+    return score, "Valid output submitted with score: {0}, with {1} rowdy groups in buses {2}".format(score, num_rowdy, buses)
 
 if __name__ == '__main__':
     score, msg = score_output(sys.argv[1], sys.argv[2])
@@ -0,0 +1,74 @@
+import re
+
+####################################################
+# Reader for parameters.txt, shared by the solvers and the scorers.
+#
+# The file holds the number of buses, the bus size and then one rowdy group
+# per line, written as a Python list of quoted student labels:
+#   2
+#   10
+#   ['3', '17', '25']
+####################################################
+
+GROUP_RE = re.compile(r"\[\s*(?:(?:'[^']*'|\"[^\"]*\")\s*(?:,\s*(?:'[^']*'|\"[^\"]*\")\s*)*)?\]")
+STUDENT_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+def _parse_int(line, lineno, name):
+    try:
+        value = int(line)
+    except ValueError:
+        raise ValueError("parameters.txt line {}: expected the {}, found {!r}".format(lineno, name, line.strip()))
+    if value <= 0:
+        raise ValueError("parameters.txt line {}: the {} must be positive, found {}".format(lineno, name, value))
+    return value
+
+
+def parse_parameters(text):
+    '''
+        Parses the contents of a parameters.txt
+
+        Inputs:
+            text - a string holding the whole file
+
+        Outputs:
+            (num_buses, size_bus, constraints, memberships)
+            num_buses - an integer representing the number of buses you can allocate to
+            size_bus - an integer representing the number of students that can fit on a bus
+            constraints - a list where each element is a list of students which represents a single rowdy group
+            memberships - a dict from each student in a rowdy group to the indices of the groups containing them
+    '''
+    lines = text.splitlines()
+    if len(lines) < 2:
+        raise ValueError("parameters.txt must start with the number of buses and the bus size")
+    num_buses = _parse_int(lines[0], 1, "number of buses")
+    size_bus = _parse_int(lines[1], 2, "bus size")
+
+    constraints = []
+    memberships = {}
+    for lineno, line in enumerate(lines[2:], 3):
+        line = line.strip()
+        if not line:
+            continue
+        if not GROUP_RE.fullmatch(line):
+            raise ValueError("parameters.txt line {}: expected a list of students, found {!r}".format(lineno, line))
+        group = [single if single or not double else double for single, double in STUDENT_RE.findall(line)]
+        if not group:
+            raise ValueError("parameters.txt line {}: rowdy group is empty".format(lineno))
+
+        index = len(constraints)
+        for student in group:
+            groups = memberships.setdefault(student, [])
+            if not groups or groups[-1] != index:
+                groups.append(index)
+        constraints.append(group)
+
+    return num_buses, size_bus, constraints, memberships
+
+
+def read_parameters(path):
+    '''
+        Reads a parameters.txt, see parse_parameters
+    '''
+    with open(path) as f:
+        return parse_parameters(f.read())
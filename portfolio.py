@@ -0,0 +1,204 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from batch import category_names, load_category_instance, parse_category_input
+from checkpoint import OutputCheckpoint
+from output_scorer import assign_buses
+from scoring import score_kernel
+
+####################################################
+# Races the solvers against each other on every input.
+#
+# Every engine runs in its own process, which loads the input itself and
+# sends back its assignment. The assignments are checked and scored in
+# memory, and only the best valid one is written, and only if it beats the
+# output already on disk. Anytime engines are given what is left of the
+# shared time budget and also send every better assignment they find on the
+# way, so the output on disk is always the best one so far, the others are
+# stopped once the budget runs out. Inputs of at most SMALL_STUDENTS students
+# are also given to the branch and bound solver, which proves an upper bound on
+# the score: as soon as an assignment reaches it, or keeps every
+# friendship, the engines still running are stopped.
+####################################################
+
+# Solver modules raced on every input, and whether they are anytime, their solve
+# taking a time_budget and a callback called with every better assignment
+ENGINES = [('solver', False), ('solver1', True), ('solver2helper', False), ('solver3', False),
+           ('solver4', False), ('solver5', False)]
+
+# Solver module proving upper bounds, see solver6.branch_and_bound
+BOUNDING_ENGINE = 'solver6'
+
+# Largest input given to BOUNDING_ENGINE
+SMALL_STUDENTS = 50
+
+# Seconds shared by the engines on every input
+TIME_BUDGET = 30.0
+
+# Share of the time budget given to the anytime engines, the rest
+# covers starting their process and loading the input
+BUDGET_SHARE = 0.8
+
+
+def run_engine(connection, engine, anytime, category_path, input_name, time_budget):
+    '''
+        Solves one input with one engine in a worker. Sends (solution, bound, error, done) for every
+        better assignment an anytime engine finds and once the engine is done, bound being None
+        unless the engine proves one.
+    '''
+    sys.stdout = open(os.devnull, 'w')
+    callback = lambda solution: connection.send(([[int(s) for s in bus] for bus in solution], None, None, False))
+    solution, bound, error = None, None, None
+    try:
+        graph, num_buses, size_bus, constraints = parse_category_input(category_path, input_name)
+        module = importlib.import_module(engine)
+        if engine == BOUNDING_ENGINE:
+            solution, _, bound = module.branch_and_bound(graph, num_buses, size_bus, constraints, time_budget,
+                                                         callback)
+        elif anytime:
+            solution = module.solve(graph, num_buses, size_bus, constraints, time_budget=time_budget,
+                                    callback=callback)
+        else:
+            solution = module.solve(graph, num_buses, size_bus, constraints)
+        solution = [[int(s) for s in bus] for bus in solution]
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    connection.send((solution, bound, error, True))
+    connection.close()
+
+
+def score_candidate(instance, solution):
+    '''
+        Returns the score of a solution on an Instance, as computed by score_output,
+        and a message, the score being -1 if the solution is not valid
+    '''
+    num_students = len(instance.labels)
+    bus_of, msg = assign_buses({s: s for s in range(num_students)}, instance.num_buses, instance.size_bus, solution)
+    if bus_of is None:
+        return -1, msg
+    if not len(instance.edges):
+        return 0, "valid"
+    _, kept, _ = score_kernel(np.array(bus_of), instance.edges, instance.rowdy_ptr, instance.rowdy_members)
+    return kept / len(instance.edges), "valid"
+
+
+def race(category_path, input_name, output_path, time_budget=TIME_BUDGET, engines=ENGINES):
+    '''
+        Runs the engines on one input and writes the best valid assignment they find,
+        replacing the output whenever an engine finds one better than the output on disk
+
+        Inputs:
+            category_path - a size category folder or pack
+            input_name - the input to solve
+            output_path - the .out file to write
+            time_budget - the number of seconds the engines share
+            engines - (module, anytime) pairs, see ENGINES
+
+        Outputs:
+            (score, winner, msg)
+            score - the score of the output left on disk, -1 if there is no valid one
+            winner - the engine which found the best assignment, None if none found a valid one
+            msg - what happened
+    '''
+    deadline = time.perf_counter() + time_budget
+    instance = load_category_instance(category_path, input_name)
+    engines = list(engines)
+    if len(instance.labels) <= SMALL_STUDENTS:
+        engines.append((BOUNDING_ENGINE, True))
+
+    running = {}
+    for engine, anytime in engines:
+        receiver, sender = Pipe(duplex=False)
+        process = Process(target=run_engine, args=(sender, engine, anytime, category_path, input_name,
+                                                   time_budget * BUDGET_SHARE), daemon=True)
+        process.start()
+        sender.close()
+        running[receiver] = (engine, process)
+
+    # the output on disk is only replaced by a better assignment
+    checkpoint = OutputCheckpoint(output_path, instance)
+    previous = checkpoint.best_score
+    best_score, winner = -1, None
+    bound = 1
+    notes = []
+    while running and checkpoint.best_score < bound:
+        left = deadline - time.perf_counter()
+        if left <= 0:
+            break
+        for receiver in wait(list(running), timeout=left):
+            engine, process = running[receiver]
+            try:
+                solution, proven, error, done = receiver.recv()
+            except EOFError:
+                solution, proven, error, done = None, None, "exited with code {}".format(process.exitcode), True
+            if done:
+                del running[receiver]
+                receiver.close()
+                process.join()
+            if proven is not None:
+                bound = min(bound, proven)
+            if solution is None:
+                notes.append("{} failed, {}".format(engine, error))
+                continue
+            score, msg = score_candidate(instance, solution)
+            if score < 0:
+                notes.append("{} gave an invalid output, {}".format(engine, msg))
+            else:
+                if score > best_score:
+                    best_score, winner = score, engine
+                checkpoint(solution, score)
+
+    for receiver, (engine, process) in running.items():
+        process.terminate()
+        process.join()
+        receiver.close()
+        notes.append("{} stopped".format(engine))
+
+    if winner is None:
+        return previous, None, "{}: no valid output. {}".format(input_name, "; ".join(notes))
+    checkpoint.flush()
+    proof = ", proven best" if best_score >= bound else ""
+    msg = "{}: {} scored {}{}".format(input_name, winner, best_score, proof)
+    if best_score <= previous:
+        msg += ", kept the output on disk scoring {}".format(previous)
+    if notes:
+        msg += ". " + "; ".join(notes)
+    return checkpoint.best_score, winner, msg
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Races the solvers on every input of a size category')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--budget', type=float, default=TIME_BUDGET)
+    parser.add_argument('--engines', nargs='+', help='solver modules to race, all of ENGINES by default')
+    args = parser.parse_args()
+
+    engines = ENGINES
+    if args.engines:
+        engines = [(engine, anytime) for engine, anytime in ENGINES if engine in args.engines]
+    if not os.path.isdir(args.output):
+        os.mkdir(args.output)
+
+    wins = {}
+    total = 0
+    for input_name in category_names(args.input):
+        try:
+            score, winner, msg = race(args.input, input_name, args.output + '/' + input_name + '.out',
+                                      args.budget, engines)
+        except (OSError, ValueError) as e:
+            print("Could not solve {}: {}".format(input_name, e))
+            continue
+        print(msg)
+        total += max(score, 0)
+        if winner is not None:
+            wins[winner] = wins.get(winner, 0) + 1
+    print('total', total)
+    print('wins', wins)
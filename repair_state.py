@@ -0,0 +1,104 @@
+import heapq
+
+from assignment_state import AssignmentState
+
+####################################################
+# Bookkeeping for emptying oversized buses one student at a time.
+#
+# On top of the kept friendships of every bus and the rowdy group counts
+# of an AssignmentState, every student knows how many friends ride their
+# bus and every bus keeps a heap of its students by that count, so the
+# student with the fewest friends on a bus is found without scanning it.
+# Moving a student only touches their friends and rowdy groups.
+####################################################
+
+
+class RepairState(AssignmentState):
+    '''
+        An AssignmentState which also finds the student of a bus with the fewest friends on it
+
+        Inputs:
+            instance - an instance_cache.Instance
+            buses - a list of buses, each a list of students 0..n-1, which may be oversized
+    '''
+
+    def __init__(self, instance, buses):
+        super().__init__(instance, buses)
+        bus_of = self.bus_of
+        # a self loop counts as a friend on the student's own bus
+        self.inside = [sum(1 for u in self.neighbors[s] if bus_of[u] == bus_of[s]) for s in range(len(bus_of))]
+        self.heaps = [[] for _ in range(self.num_buses)]
+        for student, bus in enumerate(bus_of):
+            self.heaps[bus].append((self.inside[student], student))
+        for heap in self.heaps:
+            heapq.heapify(heap)
+
+    def move(self, student, bus):
+        old = self.bus_of[student]
+        change = super().move(student, bus)
+        if old == bus:
+            return change
+
+        bus_of = self.bus_of
+        inside = self.inside
+        count = 0
+        for u in self.neighbors[student]:
+            if u == student or bus_of[u] == bus:
+                count += 1
+                if u != student:
+                    inside[u] += 1
+                    heapq.heappush(self.heaps[bus], (inside[u], u))
+            elif bus_of[u] == old:
+                inside[u] -= 1
+                heapq.heappush(self.heaps[old], (inside[u], u))
+        inside[student] = count
+        heapq.heappush(self.heaps[bus], (count, student))
+        return change
+
+    def loneliest(self, bus):
+        '''
+            Returns the student of bus with the fewest friends on it, the lowest on ties
+        '''
+        heap = self.heaps[bus]
+        while heap:
+            count, student = heap[0]
+            if self.bus_of[student] == bus and self.inside[student] == count:
+                return student
+            heapq.heappop(heap)
+        return None
+
+    def scores_with(self, student):
+        '''
+            Returns, for every bus, the number of friendships it would keep with student on it.
+            The student's own bus gets its current count.
+        '''
+        bus_of = self.bus_of
+        dead = self.dead
+        own = bus_of[student]
+        scores = list(self.internal)
+        loop = 0
+        # a student alone in a rowdy group never counts, wherever they ride
+        lonely = any(len(self.groups[g]) == 1 for g in self.memberships[student])
+        for u in ([] if lonely else self.neighbors[student]):
+            if u == student:
+                loop = 1
+            elif not dead[u] and bus_of[u] != own:
+                scores[bus_of[u]] += 1
+        for bus in range(self.num_buses):
+            if bus != own:
+                scores[bus] += loop
+
+        # buses holding every other student of one of student's rowdy groups are priced by trying
+        completing = set()
+        for g in self.memberships[student]:
+            occupancy = self.occupancy[g]
+            if len(occupancy) == 1:
+                continue
+            for bus, count in occupancy.items():
+                if bus != own and count == len(self.groups[g]) - 1:
+                    completing.add(bus)
+        for bus in completing:
+            super().move(student, bus)
+            scores[bus] = self.internal[bus]
+            super().move(student, own)
+        return scores
@@ -0,0 +1,233 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+####################################################
+# To run:
+#   python3 results_store.py [--db PATH] runs
+#   python3 results_store.py [--db PATH] best [--category C]
+#   python3 results_store.py [--db PATH] regressions <run> <later_run>
+#   python3 results_store.py [--db PATH] merge <output_dir> [--category C]
+#
+#   runs - lists the scoring runs stored so far
+#   best - prints the best score ever stored for every instance
+#   regressions - prints the instances which scored lower in later_run than in run
+#   merge - writes the best output ever stored for every instance to output_dir/<category>/<instance>.out
+#
+# Scores of the scorers, kept in a SQLite database.
+#
+# Every time score_all.py or score_all_helper.py score an output folder they
+# record a run (when, which category, which solver made the outputs) and,
+# for every instance, the scores, the number of unbroken rowdy groups, the
+# time it took to score, the peak memory allocated while scoring it (when
+# the scorer was run with --memory) and the output itself, so the best outputs can be put back together even after
+# they were overwritten. Rows are written BATCH_ROWS at a time in one
+# transaction.
+####################################################
+
+###########################################
+# Change this variable if you want the
+# results to be stored in a different
+# database
+###########################################
+path_to_results = "./results.sqlite"
+
+# Rows buffered before they are written in one transaction
+BATCH_ROWS = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    category TEXT,
+    solver TEXT,
+    input_dir TEXT,
+    output_dir TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER REFERENCES runs(id),
+    instance TEXT,
+    score_before REAL,
+    score REAL,
+    num_rowdy INTEGER,
+    wall_time REAL,
+    peak_memory INTEGER,
+    output TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run, instance);
+'''
+
+
+def traced(function, *args):
+    '''
+        Calls function with args and returns (its result, the peak memory it allocated in kilobytes).
+        Memory is traced with tracemalloc, so it is the peak of this call alone and not of the process.
+    '''
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak // 1024
+
+
+def read_text(path):
+    '''
+        Returns the contents of a file, or None if it cannot be read
+    '''
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_text(path, text):
+    '''
+        Writes text to a file through a temporary file, so a killed run never leaves half of it
+    '''
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def category_of(input_dir):
+    '''
+        Returns the size category of an input folder or pack, e.g. medium for ./all_inputs/medium.pack
+    '''
+    name = os.path.basename(os.path.normpath(input_dir))
+    return name[:-len('.pack')] if name.endswith('.pack') else name
+
+
+class ResultsStore:
+    '''
+        A SQLite database of scoring runs
+
+        Inputs:
+            path - the database file, created if it does not exist
+    '''
+
+    def __init__(self, path=path_to_results):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.pending = []
+
+    def start_run(self, category, solver, input_dir, output_dir):
+        '''
+            Records a new run and returns its id
+        '''
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (started, category, solver, input_dir, output_dir) VALUES (?, ?, ?, ?, ?)',
+                (time.time(), category, solver, input_dir, output_dir))
+        return cursor.lastrowid
+
+    def add(self, run, instance, score_before, score, num_rowdy, wall_time, peak_memory, output):
+        '''
+            Buffers the result of one instance, writing the buffer once it holds BATCH_ROWS of them.
+            Scores are -1 for an output which is not valid.
+        '''
+        self.pending.append((run, instance, score_before, score, num_rowdy, wall_time, peak_memory, output))
+        if len(self.pending) >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        with self.connection:
+            self.connection.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def runs(self):
+        '''
+            Returns (id, started, category, solver, output_dir, instances, total score) for every run
+        '''
+        return self.connection.execute('''
+            SELECT runs.id, runs.started, runs.category, runs.solver, runs.output_dir,
+                   COUNT(results.instance), SUM(MAX(results.score, 0))
+            FROM runs LEFT JOIN results ON results.run = runs.id
+            GROUP BY runs.id ORDER BY runs.id''').fetchall()
+
+    def best(self, category=None):
+        '''
+            Returns (category, instance, score, run, solver, output) for the best valid result ever
+            stored for every instance, the earliest run on ties
+        '''
+        rows = self.connection.execute('''
+            SELECT runs.category, results.instance, results.score, runs.id, runs.solver, results.output
+            FROM results JOIN runs ON results.run = runs.id
+            WHERE results.score >= 0 AND (? IS NULL OR runs.category = ?)
+            ORDER BY runs.category, results.instance, results.score DESC, runs.id''',
+            (category, category)).fetchall()
+        best = {}
+        for row in rows:
+            best.setdefault((row[0], row[1]), row)
+        return sorted(best.values(), key=lambda row: (row[0], len(row[1]), row[1]))
+
+    def regressions(self, run, later_run):
+        '''
+            Returns (instance, score, later score) for the instances of both runs which scored
+            lower in later_run
+        '''
+        rows = self.connection.execute('''
+            SELECT earlier.instance, earlier.score, later.score
+            FROM results AS earlier JOIN results AS later ON earlier.instance = later.instance
+            WHERE earlier.run = ? AND later.run = ? AND later.score < earlier.score''',
+            (run, later_run)).fetchall()
+        return sorted(rows, key=lambda row: (len(row[0]), row[0]))
+
+    def merge(self, output_dir, category=None):
+        '''
+            Writes the best output ever stored for every instance to output_dir/<category>/<instance>.out
+            and returns the number of outputs written
+        '''
+        written = 0
+        for row_category, instance, score, run, solver, output in self.best(category):
+            if output is None:
+                continue
+            category_dir = os.path.join(output_dir, row_category)
+            os.makedirs(category_dir, exist_ok=True)
+            write_text(os.path.join(category_dir, instance + '.out'), output)
+            written += 1
+        return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries the results stored by the scorers')
+    parser.add_argument('--db', default=path_to_results)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs')
+    best_parser = commands.add_parser('best')
+    best_parser.add_argument('--category')
+    regressions_parser = commands.add_parser('regressions')
+    regressions_parser.add_argument('run', type=int)
+    regressions_parser.add_argument('later_run', type=int)
+    merge_parser = commands.add_parser('merge')
+    merge_parser.add_argument('output_dir')
+    merge_parser.add_argument('--category')
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == 'runs':
+        for run, started, category, solver, output_dir, instances, total in store.runs():
+            print(run, time.strftime('%Y-%m-%d %H:%M', time.localtime(started)), category, solver, output_dir,
+                  instances, 'instances, total', total)
+    elif args.command == 'best':
+        total = 0
+        for category, instance, score, run, solver, _ in store.best(args.category):
+            total += score
+            print(category, instance, score, 'run', run, solver)
+        print('total', total)
+    elif args.command == 'regressions':
+        for instance, score, later_score in store.regressions(args.run, args.later_run):
+            print(instance, score, '->', later_score)
+    else:
+        print('wrote', store.merge(args.output_dir, args.category), 'outputs')
+    store.close()
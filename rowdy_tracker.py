@@ -0,0 +1,151 @@
+import numpy as np
+
+####################################################
+# Incremental rowdy group bookkeeping for growing sets of students.
+#
+# A RowdyIndex maps every student to the rowdy groups containing them. A
+# RowdyTracker follows one set of students (a cluster or a bus) and counts
+# how many students of each group are already in it, so asking whether
+# adding a student would put a whole rowdy group together only looks at
+# that student's groups.
+####################################################
+
+
+class RowdyIndex:
+    '''
+        The student -> rowdy groups index of an Instance, read from its membership CSR
+
+        Inputs:
+            instance - an Instance, see instance_cache
+    '''
+
+    def __init__(self, instance):
+        self.sizes = np.bincount(instance.member_groups, minlength=len(instance.rowdy_ptr) - 1).tolist()
+        member_ptr = instance.member_ptr.tolist()
+        member_groups = instance.member_groups.tolist()
+        self.memberships = [member_groups[member_ptr[s]:member_ptr[s + 1]] for s in range(len(member_ptr) - 1)]
+
+    def groups_of(self, student):
+        return self.memberships[student]
+
+    def tracker(self, students=()):
+        tracker = RowdyTracker(self)
+        for student in students:
+            tracker.add(student)
+        return tracker
+
+
+class RowdyTracker:
+    '''
+        Counts the students of every rowdy group in one set of students
+    '''
+
+    def __init__(self, index):
+        self.index = index
+        self.counts = {}
+        # number of groups all of whose students are in the set
+        self.complete = 0
+
+    def add(self, student):
+        sizes = self.index.sizes
+        for g in self.index.groups_of(student):
+            count = self.counts.get(g, 0) + 1
+            self.counts[g] = count
+            if count == sizes[g]:
+                self.complete += 1
+
+    def remove(self, student):
+        sizes = self.index.sizes
+        for g in self.index.groups_of(student):
+            count = self.counts[g]
+            if count == sizes[g]:
+                self.complete -= 1
+            if count == 1:
+                del self.counts[g]
+            else:
+                self.counts[g] = count - 1
+
+    def update(self, other):
+        '''
+            Adds the students followed by another tracker, the two sets must be disjoint
+        '''
+        sizes = self.index.sizes
+        for g, other_count in other.counts.items():
+            count = self.counts.get(g, 0) + other_count
+            self.counts[g] = count
+            if count == sizes[g]:
+                self.complete += 1
+
+    def subtract(self, other):
+        '''
+            Removes the students followed by another tracker, which must all be in the set
+        '''
+        sizes = self.index.sizes
+        for g, other_count in other.counts.items():
+            count = self.counts[g]
+            if count == sizes[g]:
+                self.complete -= 1
+            if count == other_count:
+                del self.counts[g]
+            else:
+                self.counts[g] = count - other_count
+
+    def is_rowdy(self):
+        return self.complete > 0
+
+    def completes(self, student):
+        '''
+            Returns whether the set plus student would contain a whole rowdy group
+        '''
+        if self.complete:
+            return True
+        sizes = self.index.sizes
+        for g in self.index.groups_of(student):
+            if self.counts.get(g, 0) + 1 == sizes[g]:
+                return True
+        return False
+
+    def completes_swap(self, removed, added):
+        '''
+            Returns whether the set without removed and with added would contain a whole rowdy group
+        '''
+        sizes = self.index.sizes
+        removed_groups = self.index.groups_of(removed)
+        complete = self.complete
+        for g in removed_groups:
+            if self.counts[g] == sizes[g]:
+                complete -= 1
+        if complete:
+            return True
+        for g in self.index.groups_of(added):
+            count = self.counts.get(g, 0) + 1
+            if g in removed_groups:
+                count -= 1
+            if count == sizes[g]:
+                return True
+        return False
+
+    def completes_with(self, other):
+        '''
+            Returns whether the union with the set of another tracker would contain a whole
+            rowdy group, the two sets must be disjoint
+        '''
+        if self.complete or other.complete:
+            return True
+        sizes = self.index.sizes
+        for g, other_count in other.counts.items():
+            if self.counts.get(g, 0) + other_count == sizes[g]:
+                return True
+        return False
+
+    def joins_group(self, other):
+        '''
+            Returns whether the union with the set of another tracker would put together
+            a rowdy group which neither set holds whole, the two sets must be disjoint
+        '''
+        sizes = self.index.sizes
+        for g, other_count in other.counts.items():
+            count = self.counts.get(g, 0)
+            if count and count + other_count == sizes[g]:
+                return True
+        return False
@@ -1,111 +1,53 @@
-import os
-import sys
-import networkx as nx
-import matplotlib.pyplot as plt
+import argparse
+
+from batch import category_names, imap_jobs
+from results_store import ResultsStore, category_of, path_to_results
+from score_all_helper import score_instance
 
 ####################################################
 # To run:
-#   python3 output_scorer.py <input_folder> <output_file>
+#   python3 score_all.py [--jobs N] [--solver NAME] [--memory] [--db PATH | --no-store] <input_dir> <output_dir>
 #
-#   input_folder - the path to the input folder
-#   output_file - the path to the output file
+#   input_dir - the path to a size category folder, or a pack of it built by corpus_pack.py
+#   output_dir - the path to the folder holding the matching .out files
+#   --jobs N - score N instances at a time in a process pool (default 1)
+#   --solver NAME - the solver which made the outputs, stored with the run (default output_dir)
+#   --memory - also store the peak memory allocated while scoring each output, tracing it slows scoring down
+#   --db PATH - the results database the run is stored in, see results_store.py (default ./results.sqlite)
+#   --no-store - only print the scores
 #
 # Examples:
-#   python3 output_scorer.py ./inputs/small/12 ./outputs/small/12.out
+#   python3 score_all.py ./all_inputs/small ./all_outputs/small
+#   python3 score_all.py --jobs 8 ./all_inputs/medium.pack ./all_outputs/medium
 ####################################################
 
-def score_output(input_folder, output_file):
-    '''
-        Takes an input and an output and returns the score of the output on that input if valid
-        
-        Inputs:
-            input_folder - a string representing the path to the input folder
-            output_file - a string representing the path to the output file
-
-        Outputs:
-            (score, msg)
-            score - a number between 0 and 1 which represents what fraction of friendships were broken
-            msg - a string which stores error messages in case the output file is not valid for the given input
-    '''
-    graph = nx.read_gml(input_folder + "/graph.gml")
-    parameters = open(input_folder + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [node.replace("'","") for node in line.split(", ")]
-        constraints.append(curr_constraint)
-
-    output = open(output_file)
-    assignments = []
-    for line in output:
-        line = line[1: -2]
-        curr_assignment = [node.replace("'","") for node in line.split(", ")]
-        assignments.append(curr_assignment)
-
-    if len(assignments) != num_buses:
-        return -1, "Must assign students to exactly {} buses, found {} buses".format(num_buses, len(assignments))
-    
-    # make sure no bus is empty or above capacity
-    for i in range(len(assignments)):
-        if len(assignments[i]) > size_bus:
-            return -1, "Bus {} is above capacity".format(i)
-        if len(assignments[i]) <= 0:
-            return -1, "Bus {} is empty".format(i)
-        
-    bus_assignments = {}
-    attendance_count = 0
-        
-    # make sure each student is in exactly one bus
-    attendance = {student:False for student in graph.nodes()}
-    for i in range(len(assignments)):
-        if not all([student in graph for student in assignments[i]]):
-            return -1, "Bus {} references a non-existant student: {}".format(i, assignments[i])
-
-        for student in assignments[i]:
-            # if a student appears more than once
-            if attendance[student] == True:
-                print(assignments[i])
-                return -1, "{0} appears more than once in the bus assignments".format(student)
-                
-            attendance[student] = True
-            bus_assignments[student] = i
-    
-    # make sure each student is accounted for
-    if not all(attendance.values()):
-        return -1, "Not all students have been assigned a bus"
-    
-    total_edges = graph.number_of_edges()
-    # Remove nodes for rowdy groups which were not broken up
-    for i in range(len(constraints)):
-        busses = set()
-        for student in constraints[i]:
-            busses.add(bus_assignments[student])
-        if len(busses) <= 1:
-            for student in constraints[i]:
-                if student in graph:
-                    graph.remove_node(student)
-
-    # score output
-    score = 0
-    for edge in graph.edges():
-        if bus_assignments[edge[0]] == bus_assignments[edge[1]]:
-            score += 1
-    score = score / total_edges
-
-
-    return score, "Valid output submitted with score: {}".format(score)
-
 if __name__ == '__main__':
-    _, input_dir, output_dir = sys.argv
+    parser = argparse.ArgumentParser(description='Scores every output of a size category')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--solver')
+    parser.add_argument('--memory', action='store_true')
+    parser.add_argument('--db', default=path_to_results)
+    parser.add_argument('--no-store', action='store_true')
+    args = parser.parse_args()
+
+    store = None
+    if not args.no_store:
+        store = ResultsStore(args.db)
+        run = store.start_run(category_of(args.input_dir), args.solver or args.output_dir, args.input_dir, args.output_dir)
+
     total = 0
     count = 0
-    for input_folder in os.listdir(input_dir):
-        score, msg = score_output(input_dir +'/'+ input_folder, output_dir + '/' + input_folder + '.out')
+    tasks = [(args.input_dir, args.output_dir, input_folder, args.memory) for input_folder in category_names(args.input_dir)]
+    for input_folder, score_before, score, num_rowdy, msg, wall_time, memory, output in imap_jobs(score_instance, tasks, args.jobs):
+        if store is not None:
+            store.add(run, input_folder, score_before, score, num_rowdy, wall_time, memory, output)
         total += max(score, 0)
         count += 1 if score >= 0 else 0
         print(msg)
     print(count)
-    print('avg: ' + str(total / count))
\ No newline at end of file
+    print('avg: ' + str(total / count))
+    if store is not None:
+        store.close()
+        print('stored as run', run)
@@ -0,0 +1,77 @@
+import numpy as np
+
+####################################################
+# Array based scoring kernel, shared by the scorers and the solvers.
+#
+# An assignment is a vector holding the bus of every student 0..n-1. A
+# friendship counts if both ends are on the same bus and neither end is in
+# a rowdy group which was not broken up, exactly like score_output.
+####################################################
+
+
+def unbroken_mask(bus_of, rowdy_ptr, rowdy_members):
+    '''
+        Returns a boolean array marking the rowdy groups whose students all share one bus
+    '''
+    num_groups = len(rowdy_ptr) - 1
+    if num_groups <= 0:
+        return np.zeros(0, dtype=bool)
+    buses = bus_of[rowdy_members]
+    starts = rowdy_ptr[:-1]
+    return np.minimum.reduceat(buses, starts) == np.maximum.reduceat(buses, starts)
+
+
+def removed_mask(num_students, unbroken, rowdy_ptr, rowdy_members):
+    '''
+        Returns a boolean array marking the students of the unbroken rowdy groups
+    '''
+    removed = np.zeros(num_students, dtype=bool)
+    if unbroken.any():
+        sizes = np.diff(rowdy_ptr)
+        removed[rowdy_members[np.repeat(unbroken, sizes)]] = True
+    return removed
+
+
+def score_kernel(bus_of, edges, rowdy_ptr, rowdy_members):
+    '''
+        Counts the friendships kept by an assignment
+
+        Inputs:
+            bus_of - an integer array holding the bus of every student
+            edges - an (E, 2) array of friendships
+            rowdy_ptr, rowdy_members - the rowdy groups in CSR form, see instance_cache.Instance
+
+        Outputs:
+            (same_bus, kept, unbroken)
+            same_bus - the number of friendships on the same bus, ignoring rowdy groups
+            kept - the number of those friendships left after removing the unbroken rowdy groups
+            unbroken - a boolean array marking the rowdy groups which were not broken up
+    '''
+    bus_of = np.asarray(bus_of)
+    same = bus_of[edges[:, 0]] == bus_of[edges[:, 1]]
+    unbroken = unbroken_mask(bus_of, rowdy_ptr, rowdy_members)
+    removed = removed_mask(len(bus_of), unbroken, rowdy_ptr, rowdy_members)
+    kept = same & ~removed[edges[:, 0]] & ~removed[edges[:, 1]]
+    return int(np.count_nonzero(same)), int(np.count_nonzero(kept)), unbroken
+
+
+def assignment_vector(solution, num_students):
+    '''
+        Turns a list of buses of students 0..n-1 into an assignment vector
+    '''
+    bus_of = np.full(num_students, -1, dtype=np.int64)
+    for i, bus in enumerate(solution):
+        bus_of[list(bus)] = i
+    return bus_of
+
+
+def score_solution(instance, solution):
+    '''
+        Returns the score of a solution (a list of buses of students 0..n-1) on an Instance,
+        or 0 if the graph has no friendships. Does not check that the solution is valid.
+    '''
+    if not len(instance.edges):
+        return 0
+    bus_of = assignment_vector(solution, len(instance.labels))
+    _, kept, _ = score_kernel(bus_of, instance.edges, instance.rowdy_ptr, instance.rowdy_members)
+    return kept / len(instance.edges)
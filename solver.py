@@ -1,6 +1,9 @@
-import networkx as nx
 import os
-import random
+
+from corpus_pack import input_parser
+from cut_tree import CutTree
+from instance_cache import graph_instance, write_output
+from repair_state import RepairState
 
 ###########################################
 # Change this variable to the path to
@@ -16,77 +19,6 @@ path_to_inputs = "./inputs"
 ###########################################
 path_to_outputs = "./outputs"
 
-def parse_input(folder_name):
-    '''
-        Parses an input and returns the corresponding graph and parameters
-
-        Inputs:
-            folder_name - a string representing the path to the input folder
-
-        Outputs:
-            (graph, num_buses, size_bus, constraints)
-            graph - the graph as a NetworkX object
-            num_buses - an integer representing the number of buses you can allocate to
-            size_buses - an integer representing the number of students that can fit on a bus
-            constraints - a list where each element is a list vertices which represents a single rowdy group
-    '''
-    graph = nx.read_gml(folder_name + "/graph.gml")
-    parameters = open(folder_name + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [num.replace("'", "") for num in line.split(", ")]
-        constraints.append(curr_constraint)
-
-    return graph, num_buses, size_bus, constraints
-
-def minimum_cut(graph):
-    cutset = set()
-    for subgraph in (graph.subgraph(c) for c in nx.connected_components(graph)):
-        edges = nx.minimum_edge_cut(subgraph)
-        if not edges:
-            continue
-        if not cutset:
-            cutset = edges
-        elif len(edges) < len(cutset):
-            cutset = edges
-    if cutset:
-        return cutset
-    else:
-        raise Exception('no way to make new connected component')
-
-def get_oversized_bus(buses, bus_size):
-    for num, bus in enumerate(buses):
-        if len(bus) > bus_size:
-            return num
-    return -1
-
-def get_rowdy_groups(bus, constraints):
-    rowdy_groups = []
-    for rowdy_group in constraints:
-        if rowdy_group.issubset(bus):
-            rowdy_groups.append(rowdy_group)
-    return rowdy_groups
-
-def score_bus(graph, bus, constraints):
-    invalid = set()
-
-    for rowdy_group in constraints:
-        if rowdy_group.issubset(bus):
-            invalid.update(rowdy_group)
-
-    score = 0
-    for kid in sorted(bus.difference(invalid)):
-        #hi chris i added this if
-        if kid in graph:
-            for neighbor in graph.neighbors(kid):
-                if neighbor in bus and neighbor not in invalid and neighbor > kid:
-                    score += 1
-    return score
-
 def solve(graph, num_buses, bus_size, constraints):
     #TODO: Write this method as you like. We'd recommend changing the arguments here as well
 
@@ -114,14 +46,15 @@ def solve(graph, num_buses, bus_size, constraints):
         new_constraints.append(set(constraint))
     constraints = new_constraints
 
-    # disconnected graph until there are num_buses connected components
-    while nx.number_connected_components(copy) < num_buses:
-        cutset = minimum_cut(copy)
-        copy.remove_edges_from(cutset)
+    # split the graph along minimum cuts until there are num_buses parts,
+    # the Gomory-Hu trees of its components are only built once
+    cuts = CutTree(copy)
+    while cuts.num_parts() < num_buses:
+        copy.remove_edges_from(cuts.split())
 
     # assign groups to buses
     buses = []
-    for group in nx.connected_components(copy):
+    for group in cuts.parts():
         if len(buses) < num_buses:
             buses.append(group)
         else:
@@ -130,9 +63,17 @@ def solve(graph, num_buses, bus_size, constraints):
                 if len(group) + len(bus) <= bus_size:
                     bus.update(group)
                     break
-
-    oversized = get_oversized_bus(buses, bus_size)
-    while oversized >= 0:
+            else:
+                # left for the repair below rather than dropped
+                min(buses, key=len).update(group)
+
+    # move students off oversized buses, earlier buses never fill up again
+    state = RepairState(graph_instance(graph, num_buses, bus_size, constraints), buses)
+    oversized = 0
+    while oversized < num_buses:
+        if state.sizes[oversized] <= bus_size:
+            oversized += 1
+            continue
         '''
         # remove people from rowdy groups first
         rowdy_groups = get_rowdy_groups(buses[oversized], constraints)
@@ -179,33 +120,24 @@ def solve(graph, num_buses, bus_size, constraints):
         oversized = get_oversized_bus(buses, bus_size)
         '''
 
-        bus = buses[oversized]
-        removed_kid = None
-        cost = 999999999
-        for kid in bus:
-            degree = sum([1 if neighbor in bus else 0 for neighbor in graph.neighbors(kid)])
-            if degree < cost:
-                cost = degree
-                removed_kid = kid
+        removed_kid = state.loneliest(oversized)
 
         best_bus = None
         best_score = -999999999
-        for num, bus in enumerate(buses):
-            if num == oversized or len(bus) == bus_size:
+        scores = state.scores_with(removed_kid)
+        for num in range(num_buses):
+            if num == oversized or state.sizes[num] >= bus_size:
                 continue
-            score = score_bus(graph, bus.union(set(removed_kid)), constraints)
-            if score > best_score:
-                best_score = score
+            if scores[num] > best_score:
+                best_score = scores[num]
                 best_bus = num
 
         if best_bus == None:
             break
 
-        buses[best_bus].add(removed_kid)
-        buses[oversized].remove(removed_kid)
-
-        oversized = get_oversized_bus(buses, bus_size)
+        state.move(removed_kid, best_bus)
 
+    buses = state.solution()
     print(buses)
 
 
@@ -230,7 +162,7 @@ def main():
         the portion which writes it to a file to make sure their output is
         formatted correctly.
     '''
-    size_categories = ["small"]
+    size_categories = ["small", "medium", "large"]
     if not os.path.isdir(path_to_outputs):
         os.mkdir(path_to_outputs)
 
@@ -242,16 +174,13 @@ def main():
         if not os.path.isdir(output_category_path):
             os.mkdir(output_category_path)
 
+        parse = input_parser(category_path)
+
         for input_folder in os.listdir(category_dir):
             input_name = os.fsdecode(input_folder)
-            graph, num_buses, size_bus, constraints = parse_input(category_path + "/" + input_name)
+            graph, num_buses, size_bus, constraints = parse(input_name)
             solution = solve(graph, num_buses, size_bus, constraints)
-            output_file = open(output_category_path + "/" + input_name + ".out", "w")
-
-            for bus in solution:
-            	output_file.write(str(bus) + '\n')
-
-            output_file.close()
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
 
 if __name__ == '__main__':
     main()
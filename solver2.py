@@ -4,6 +4,12 @@ import random
 
 from random import choice
 
+from cluster_state import ClusterState
+from clustering_index import ClusteringIndex
+from corpus_pack import input_parser
+from instance_cache import graph_instance, write_output
+from rowdy_tracker import RowdyIndex
+
 ###########################################
 # Change this variable to the path to
 # the folder containing all three input
@@ -18,84 +24,41 @@ path_to_inputs = "./all_inputs"
 ###########################################
 path_to_outputs = "./all_outputs"
 
-def parse_input(folder_name):
-    '''
-        Parses an input and returns the corresponding graph and parameters
-
-        Inputs:
-            folder_name - a string representing the path to the input folder
-
-        Outputs:
-            (graph, num_buses, size_bus, constraints)
-            graph - the graph as a NetworkX object
-            num_buses - an integer representing the number of buses you can allocate to
-            size_buses - an integer representing the number of students that can fit on a bus
-            constraints - a list where each element is a list vertices which represents a single rowdy group
-    '''
-    graph = nx.read_gml(folder_name + "/graph.gml")
-    parameters = open(folder_name + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [num.replace("'", "") for num in line.split(", ")]
-        constraints.append(curr_constraint)
-
-    return graph, num_buses, size_bus, constraints
-
-
-
 def solve(graph, num_buses, bus_size, constraints):
     #TODO: Write this method as you like. We'd recommend changing the arguments here as well
 
     print('start solve')
 
-    graph.remove_edges_from(graph.selfloop_edges())
+    graph.remove_edges_from(list(nx.selfloop_edges(graph)))
 
     num_kids = len(graph.nodes())
     max_bus_size = min(bus_size, num_kids - num_buses + 1)
 
-    for i in range(len(constraints)):
-        constraints[i] = set(constraints[i])
-    #constraints = sorted(constraints, key=lambda c: -len(c))
-
-    def isrowdy(group):
-        for constraint in constraints:
-            if constraint.issubset(group):
-                return constraint
-        return None
-
+    rowdy = RowdyIndex(graph_instance(graph, num_buses, bus_size, constraints))
 
     clusters = []
+    trackers = []
     copy = graph.copy()
+    seeds = ClusteringIndex(copy, with_degree=True)
+    state = ClusterState(copy)
 
     while copy.nodes():
-        clustering = nx.clustering(copy)
-        degrees = copy.degree()
-        start = max([(entry[0], entry[1] + degrees[entry[0]]) for entry in clustering.items()], key=lambda e: e[1])[0]
+        # kept up to date as clusters are removed, matches nx.clustering(copy)
+        clustering = seeds.clustering
+        start = seeds.best()
         #start = choice(list(copy.nodes()))
 
-        print('\tinitial node: ' + start, end='')
+        print('\tinitial node: ' + str(start), end='')
 
-        cluster = set([start])
-        fringe = set(copy.neighbors(start))
+        state.start([start])
+        tracker = rowdy.tracker([start])
+        links = state.links
 
-        fgraph = nx.Graph()
-        fgraph.add_node(start)
-        for node in fringe:
-            fgraph.add_node(node)
-            for neighbor in copy.neighbors(node):
-                if neighbor in cluster:
-                    fgraph.add_edge(node, neighbor)
-
-        while fringe and len(cluster) < max_bus_size:
-            degrees = fgraph.degree()
-            candidates = sorted(fringe, key=lambda node: -(degrees[node] + clustering[node]))
+        while state.fringe and len(state.cluster) < max_bus_size:
+            candidates = sorted(state.fringe, key=lambda node: (-(links[node] + clustering[node]), node))
             index = -1
             for i in range(len(candidates)):
-                if not isrowdy(cluster.union(set([candidates[i]]))):
+                if not tracker.completes(candidates[i]):
                     index = i
                     break
 
@@ -103,74 +66,35 @@ def solve(graph, num_buses, bus_size, constraints):
                 break
 
             candidate = candidates[index]
-            fringe.remove(candidate)
-            cluster.add(candidate)
-            for neighbor in copy.neighbors(candidate):
-                if neighbor in fringe:
-                    fgraph.add_edge(candidate, neighbor)
-                elif neighbor not in cluster:
-                    fringe.add(neighbor)
-                    fgraph.add_node(neighbor)
-                    for neighbor_neighbor in copy.neighbors(neighbor):
-                        if neighbor_neighbor in cluster:
-                            fgraph.add_edge(neighbor, neighbor_neighbor)
-
-        cgraph = nx.Graph()
-        for node in cluster:
-            cgraph.add_node(node)
-            for neighbor in copy.neighbors(node):
-                if neighbor in cluster:
-                    cgraph.add_edge(node, neighbor)
-        while fringe:
-            cdegrees = cgraph.degree()
-            loneliest = min(cluster, key=lambda node: cdegrees[node])
-            fcopy = fgraph.copy()
-            fcopy.remove_node(loneliest)
-            fdegrees = fcopy.degree()
-            friendly_list = sorted(fringe, key=lambda node: -fdegrees[node])
+            state.add(candidate)
+            tracker.add(candidate)
+
+        # swap the student with the fewest friends in the cluster for a fringe student with more
+        while state.fringe:
+            loneliest = state.loneliest()
             friendliest = None
-            difference = cluster.difference(set([loneliest]))
-            for node in friendly_list:
-                if fdegrees[node] <= cdegrees[loneliest]:
-                    break
-                if fdegrees[node] > cdegrees[loneliest] and not isrowdy(difference.union(set([node]))):
+            for node in state.swap_candidates(loneliest):
+                if not tracker.completes_swap(loneliest, node):
                     friendliest = node
                     break
-            if not friendliest:
+            if friendliest is None:
                 break
-            cgraph.remove_node(loneliest)
-            cgraph.add_node(friendliest)
-            cluster.remove(loneliest)
-            cluster.add(friendliest)
-            fringe.remove(friendliest)
-            fringe.add(loneliest)
-            for neighbor in copy.neighbors(loneliest):
-                if neighbor in cluster:
-                    fgraph.add_edge(loneliest, neighbor)
-                elif neighbor in fringe:
-                    fgraph.remove_edge(loneliest, neighbor)
-                    if not next(fgraph.neighbors(neighbor), None):
-                        fgraph.remove_node(neighbor)
-                        fringe.remove(neighbor)
-            for neighbor in copy.neighbors(friendliest):
-                if neighbor in cluster:
-                    cgraph.add_edge(friendliest, neighbor)
-                    fgraph.remove_edge(friendliest, neighbor)
-                elif neighbor in fringe:
-                    fgraph.add_edge(friendliest, neighbor)
-                else:
-                    fgraph.add_node(neighbor)
-                    fringe.add(neighbor)
-                    for neighbor_neighbor in copy.neighbors(neighbor):
-                        if neighbor_neighbor in cluster:
-                            fgraph.add_edge(neighbor, neighbor_neighbor)
+            state.remove(loneliest)
+            state.add(friendliest)
+            tracker.remove(loneliest)
+            tracker.add(friendliest)
 
+        cluster = state.cluster
         clusters.append(cluster)
+        trackers.append(tracker)
         copy.remove_nodes_from(cluster)
+        seeds.remove_nodes(cluster)
         print('\tsize: ' + str(len(cluster)))
 
 
-    clusters = sorted(clusters, key=lambda c: -len(c))
+    order = sorted(range(len(clusters)), key=lambda i: -len(clusters[i]))
+    clusters = [clusters[i] for i in order]
+    trackers = [trackers[i] for i in order]
     #print(clusters)
     buses = []
 
@@ -187,14 +111,18 @@ def solve(graph, num_buses, bus_size, constraints):
         for cluster in clusters:
             buses.append(cluster)
     elif len(clusters) > num_buses:
+        bus_trackers = []
         for i in range(num_buses - 1):
             buses.append(clusters[i])
+            bus_trackers.append(trackers[i])
         buses.append(set())
+        bus_trackers.append(rowdy.tracker())
         for i in range(num_buses - 1, len(clusters)):
             added = False
             for j in range(num_buses):
-                if len(buses[j]) + len(clusters[i]) <= bus_size and not isrowdy(buses[j].union(clusters[i])):
+                if len(buses[j]) + len(clusters[i]) <= bus_size and not bus_trackers[j].completes_with(trackers[i]):
                     buses[j].update(clusters[i])
+                    bus_trackers[j].update(trackers[i])
                     added = True
                     break
             if added:
@@ -202,13 +130,16 @@ def solve(graph, num_buses, bus_size, constraints):
             for j in range(num_buses - 1, -1, -1):
                 if len(buses[j]) + len(clusters[i]) <= bus_size:
                     buses[j].update(clusters[i])
+                    bus_trackers[j].update(trackers[i])
                     added = True
                     break
             if added:
                 continue
             for j in range(num_buses - 1, -1, -1):
                 while clusters[i] and len(buses[j]) < bus_size:
-                    buses[j].add(clusters[i].pop())
+                    student = clusters[i].pop()
+                    buses[j].add(student)
+                    bus_trackers[j].add(student)
         if not len(buses[-1]):
             source = 0
             while source + 1 < len(buses) and len(buses[source + 1]) > 1:
@@ -249,17 +180,14 @@ def main():
         if not os.path.isdir(output_category_path):
             os.mkdir(output_category_path)
 
+        parse = input_parser(category_path)
+
         for input_folder in os.listdir(category_dir):
             input_name = os.fsdecode(input_folder)
-            graph, num_buses, size_bus, constraints = parse_input(category_path + "/" + input_name)
+            graph, num_buses, size_bus, constraints = parse(input_name)
             print('solving', size, input_name)
             solution = solve(graph, num_buses, size_bus, constraints)
-            output_file = open(output_category_path + "/" + input_name + ".out", "w")
-
-            for bus in solution:
-            	output_file.write(str(bus) + '\n')
-
-            output_file.close()
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
 
 if __name__ == '__main__':
     main()
@@ -1,9 +1,18 @@
-import networkx as nx
+import argparse
+import heapq
 import os
 import random
-from multiprocessing import Pool
 from random import choice
 
+from cluster_state import ClusterState
+from clustering_index import ClusteringIndex
+from batch import category_names, imap_jobs, load_category_instance, parse_category_input
+from instance_cache import graph_instance, write_output
+from manifest import Manifest, instance_hash, local_modules, solver_hash, solver_settings
+from output_scorer import output_score
+from rowdy_tracker import RowdyIndex
+from scoring import score_solution
+
 ###########################################
 # Change this variable to the path to
 # the folder containing all three input
@@ -18,35 +27,6 @@ path_to_inputs = "./all_inputs"
 ###########################################
 path_to_outputs = "./all_outputs"
 
-def parse_input(folder_name):
-    '''
-        Parses an input and returns the corresponding graph and parameters
-
-        Inputs:
-            folder_name - a string representing the path to the input folder
-
-        Outputs:
-            (graph, num_buses, size_bus, constraints)
-            graph - the graph as a NetworkX object
-            num_buses - an integer representing the number of buses you can allocate to
-            size_buses - an integer representing the number of students that can fit on a bus
-            constraints - a list where each element is a list vertices which represents a single rowdy group
-    '''
-    graph = nx.read_gml(folder_name + "/graph.gml")
-    parameters = open(folder_name + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [num.replace("'", "") for num in line.split(", ")]
-        constraints.append(curr_constraint)
-
-    return graph, num_buses, size_bus, constraints
-
-
-
 def solve(graph, num_buses, bus_size, constraints):
     #TODO: Write this method as you like. We'd recommend changing the arguments here as well
 
@@ -55,111 +35,77 @@ def solve(graph, num_buses, bus_size, constraints):
     num_kids = len(graph.nodes())
     max_bus_size = min(bus_size, num_kids - num_buses + 1)
 
-    for i in range(len(constraints)):
-        constraints[i] = set(constraints[i])
-    #constraints = sorted(constraints, key=lambda c: -len(c))
-
-    def isrowdy(group):
-        for constraint in constraints:
-            if constraint.issubset(group):
-                return constraint
-        return None
-
+    rowdy = RowdyIndex(graph_instance(graph, num_buses, bus_size, constraints))
 
     clusters = []
+    trackers = []
     copy = graph.copy()
+    seeds = ClusteringIndex(copy, with_degree=False)
+    state = ClusterState(copy)
 
     while copy.nodes():
-        clustering = nx.clustering(copy)
-        start = max([entry for entry in clustering.items()], key=lambda e: e[1])[0]
-
-        print('\tinitial node: ' + start, end='')
-
-        cluster = set([start])
-        fringe = set(copy.neighbors(start))
-
-        fgraph = nx.Graph()
-        fgraph.add_node(start)
-        for node in fringe:
-            fgraph.add_node(node)
-            for neighbor in copy.neighbors(node):
-                if neighbor in cluster:
-                    fgraph.add_edge(node, neighbor)
-
-        while fringe and len(cluster) < max_bus_size:
-            degrees = fgraph.degree()
-            candidates = sorted(fringe, key=lambda node: -(degrees[node] + clustering[node]))
-            index = -1
-            for i in range(len(candidates)):
-                if not isrowdy(cluster.union(set([candidates[i]]))):
-                    index = i
-                    break
+        # kept up to date as clusters are removed, matches nx.clustering(copy)
+        clustering = seeds.clustering
+        start = seeds.best()
 
-            if index == -1:
-                break
+        print('\tinitial node: ' + str(start), end='')
+
+        state.start([start])
+        tracker = rowdy.tracker([start])
+        links = state.links
+
+        # The queue holds (-(links + clustering), node) for the fringe and may hold
+        # outdated entries for a node, only the one matching its current key counts.
+        queue = []
+        rejected = set()
+
+        def push(node):
+            heapq.heappush(queue, (-(links[node] + clustering[node]), node))
 
-            candidate = candidates[index]
-            fringe.remove(candidate)
-            cluster.add(candidate)
-            for neighbor in copy.neighbors(candidate):
-                if neighbor in fringe:
-                    fgraph.add_edge(candidate, neighbor)
-                elif neighbor not in cluster:
-                    fringe.add(neighbor)
-                    fgraph.add_node(neighbor)
-                    for neighbor_neighbor in copy.neighbors(neighbor):
-                        if neighbor_neighbor in cluster:
-                            fgraph.add_edge(neighbor, neighbor_neighbor)
-
-        cgraph = nx.Graph()
-        for node in cluster:
-            cgraph.add_node(node)
-            for neighbor in copy.neighbors(node):
-                if neighbor in cluster:
-                    cgraph.add_edge(node, neighbor)
-        while False:
-            cdegrees = cgraph.degree()
-            loneliest = min(cluster, key=lambda node: cdegrees[node])
-            fcopy = fgraph.copy()
-            fcopy.remove_node(loneliest)
-            fdegrees = fcopy.degree()
-            friendly_list = sorted(fringe, key=lambda node: -fdegrees[node])
+        for node in state.fringe:
+            push(node)
+
+        while queue and len(state.cluster) < max_bus_size:
+            key, candidate = heapq.heappop(queue)
+            if candidate not in state.fringe or candidate in rejected or key != -(links[candidate] + clustering[candidate]):
+                continue
+            if tracker.completes(candidate):
+                # the cluster only grows here, so candidate stays out for good
+                rejected.add(candidate)
+                continue
+
+            state.add(candidate)
+            tracker.add(candidate)
+            for neighbor in state.neighbors(candidate):
+                if neighbor in state.fringe and neighbor not in rejected:
+                    push(neighbor)
+
+        # swap the student with the fewest friends in the cluster for a fringe student with more
+        while state.fringe:
+            loneliest = state.loneliest()
             friendliest = None
-            difference = cluster.difference(set([loneliest]))
-            for node in friendly_list:
-                if fdegrees[node] <= cdegrees[loneliest]:
-                    break
-                if fdegrees[node] > cdegrees[loneliest] and not isrowdy(difference.union(set([node]))):
+            for node in state.swap_candidates(loneliest):
+                if not tracker.completes_swap(loneliest, node):
                     friendliest = node
                     break
-            if not friendliest:
+            if friendliest is None:
                 break
-            cgraph.remove_node(loneliest)
-            fgraph.add_node(loneliest)
-            fgraph.remove_node(friendliest)
-            cgraph.add_node(friendliest)
-            cluster.remove(loneliest)
-            fringe.add(loneliest)
-            fringe.remove(friendliest)
-            cluster.add(friendliest)
-            for neighbor in copy.neighbors(loneliest):
-                if neighbor in fringe:
-                    fgraph.add_edge(loneliest, neighbor)
-                elif neighbor not in cluster:
-                    fgraph.add_node(neighbor)
-                    for neighbor_neighbor in copy.neighbors(neighbor):
-                        if neighbor_neighbor in cluster:
-                            fgraph.add_edge(neighbor, neighbor_neighbor)
-            for neighbor in copy.neighbors(friendliest):
-                if neighbor in cluster:
-                    cgraph.add_edge(friendliest, neighbor)
+            state.remove(loneliest)
+            state.add(friendliest)
+            tracker.remove(loneliest)
+            tracker.add(friendliest)
 
+        cluster = state.cluster
         clusters.append(cluster)
+        trackers.append(tracker)
         copy.remove_nodes_from(cluster)
+        seeds.remove_nodes(cluster)
         print('\tsize: ' + str(len(cluster)))
 
 
-    clusters = sorted(clusters, key=lambda c: -len(c))
+    order = sorted(range(len(clusters)), key=lambda i: -len(clusters[i]))
+    clusters = [clusters[i] for i in order]
+    trackers = [trackers[i] for i in order]
     #print(clusters)
     buses = []
 
@@ -176,14 +122,18 @@ def solve(graph, num_buses, bus_size, constraints):
         for cluster in clusters:
             buses.append(cluster)
     elif len(clusters) > num_buses:
+        bus_trackers = []
         for i in range(num_buses - 1):
             buses.append(clusters[i])
+            bus_trackers.append(trackers[i])
         buses.append(set())
+        bus_trackers.append(rowdy.tracker())
         for i in range(num_buses - 1, len(clusters)):
             added = False
             for j in range(num_buses):
-                if len(buses[j]) + len(clusters[i]) <= bus_size and not isrowdy(buses[j].union(clusters[i])):
+                if len(buses[j]) + len(clusters[i]) <= bus_size and not bus_trackers[j].completes_with(trackers[i]):
                     buses[j].update(clusters[i])
+                    bus_trackers[j].update(trackers[i])
                     added = True
                     break
             if added:
@@ -191,13 +141,16 @@ def solve(graph, num_buses, bus_size, constraints):
             for j in range(num_buses - 1, -1, -1):
                 if len(buses[j]) + len(clusters[i]) <= bus_size:
                     buses[j].update(clusters[i])
+                    bus_trackers[j].update(trackers[i])
                     added = True
                     break
             if added:
                 continue
             for j in range(num_buses - 1, -1, -1):
                 while clusters[i] and len(buses[j]) < bus_size:
-                    buses[j].add(clusters[i].pop())
+                    student = clusters[i].pop()
+                    buses[j].add(student)
+                    bus_trackers[j].add(student)
         if not len(buses[-1]):
             source = 0
             while source + 1 < len(buses) and len(buses[source + 1]) > 1:
@@ -219,13 +172,27 @@ def solve(graph, num_buses, bus_size, constraints):
     return [list(bus) for bus in buses]
 
 
-def solve_and_write(params):
-    output_path = params[4]
-    sol = solve(params[0], params[1], params[2], params[3])
-    output_file = open(output_path, "w")
-    for bus in sol:
-        output_file.write(str(bus) + '\n')
-    output_file.close()
+def solve_and_write(task):
+    '''
+        Solves one input in a worker, task is (category_path, input_name, output_path, previous).
+        The worker loads the input itself so only these names cross the process boundary.
+        The output is only replaced if the new one beats the previous score, which is computed from
+        the output on disk if it is None, and the score of the output left on disk is returned with
+        a message, the score being None if solving failed.
+    '''
+    category_path, input_name, output_path, previous = task
+    try:
+        graph, num_buses, size_bus, constraints = parse_category_input(category_path, input_name)
+    except (OSError, ValueError) as e:
+        return input_name, None, "Could not solve {}: {}".format(input_name, e)
+    if previous is None:
+        previous = output_score(graph.graph["instance"], output_path)
+    sol = solve(graph, num_buses, size_bus, constraints)
+    score = score_solution(graph.graph["instance"], sol)
+    if score <= previous:
+        return input_name, previous, "kept {}, {} does not beat {}".format(output_path, score, previous)
+    write_output(output_path, sol, graph.graph["labels"])
+    return input_name, score, "wrote {} with score {}".format(output_path, score)
 
 def main():
     '''
@@ -234,6 +201,19 @@ def main():
         the portion which writes it to a file to make sure their output is
         formatted correctly.
     '''
+    parser = argparse.ArgumentParser(description='Solves every input of the size categories')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--min-gain', type=float, default=0.0,
+                        help='after a solver change, only re-solve outputs which could still gain this much')
+    parser.add_argument('--force', action='store_true',
+                        help='re-solve every input, outputs are still only replaced by better ones')
+    args = parser.parse_args()
+
+    # the solver is every module of this folder loaded by now, the ones reading, solving and
+    # scoring inputs, a change to any of them or to their settings makes the manifest re-solve inputs
+    modules = local_modules(os.path.dirname(os.path.abspath(__file__)))
+    solver_digest = solver_hash([module.__file__ for module in modules], solver_settings(modules))
+
     size_categories = ["medium"]
     if not os.path.isdir(path_to_outputs):
         os.mkdir(path_to_outputs)
@@ -241,23 +221,37 @@ def main():
     for size in size_categories:
         category_path = path_to_inputs + "/" + size
         output_category_path = path_to_outputs + "/" + size
-        category_dir = os.fsencode(category_path)
 
         if not os.path.isdir(output_category_path):
             os.mkdir(output_category_path)
 
-        problems = []
-        # put all problem inputs into a list
-        for input_folder in os.listdir(category_dir):
-            input_name = os.fsdecode(input_folder)
-            graph, num_buses, size_bus, constraints = parse_input(category_path + "/" + input_name)
+        # workers are only sent names, each loads its inputs from the cache or the category's pack,
+        # inputs whose output the manifest shows is up to date are skipped
+        manifest = Manifest(output_category_path)
+        tasks = []
+        input_digests = {}
+        for input_name in category_names(category_path):
             output_path = output_category_path + "/" + input_name + ".out"
-            problem = (graph, num_buses, size_bus, constraints, output_path)
-            problems.append(problem)
-
-        # in a parallel way, solve all the problems
-        with Pool(5) as p:
-            p.map(solve_and_write, problems)
+            try:
+                input_digests[input_name] = instance_hash(load_category_instance(category_path, input_name))
+            except (OSError, ValueError) as e:
+                print("Could not solve {}: {}".format(input_name, e))
+                continue
+            stale = manifest.stale(input_name, input_digests[input_name], solver_digest, output_path, args.min_gain)
+            if stale is None and not args.force:
+                continue
+            # with --force the worker scores the output on disk itself rather than trusting the manifest
+            previous = None if args.force else manifest.score(input_name, input_digests[input_name], output_path)
+            tasks.append((category_path, input_name, output_path, previous))
+        print(size, "solving", len(tasks), "of", len(input_digests))
+
+        # in a parallel way, solve all the problems, reporting each as soon as it is written
+        for input_name, score, msg in imap_jobs(solve_and_write, tasks, args.jobs, ordered=False):
+            print(msg)
+            if score is not None:
+                output_path = output_category_path + "/" + input_name + ".out"
+                manifest.record(input_name, input_digests[input_name], solver_digest, output_path, score)
+                manifest.save()
 
 '''
         for input_folder in os.listdir(category_dir):
@@ -265,12 +259,7 @@ def main():
             graph, num_buses, size_bus, constraints = parse_input(category_path + "/" + input_name)
             print('solving', size, input_name)
             solution = solve(graph, num_buses, size_bus, constraints)
-            output_file = open(output_category_path + "/" + input_name + ".out", "w")
-
-            for bus in solution:
-            	output_file.write(str(bus) + '\n')
-
-            output_file.close()
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
 '''
 
 if __name__ == '__main__':
@@ -0,0 +1,538 @@
+import heapq
+import os
+
+from collections import namedtuple
+
+from assignment_state import AssignmentState
+from corpus_pack import input_parser
+from instance_cache import graph_instance, write_output
+from rowdy_tracker import RowdyIndex
+
+###########################################
+# Change this variable to the path to
+# the folder containing all three input
+# size category folders
+###########################################
+path_to_inputs = "./all_inputs"
+
+###########################################
+# Change this variable if you want
+# your outputs to be put in a
+# different folder
+###########################################
+path_to_outputs = "./all_outputs"
+
+###########################################
+# Multilevel solver.
+#
+# Coarsening repeatedly matches every block of students with the neighbor
+# block it shares the most friendships with, as long as the pair fits on a
+# bus and does not put a rowdy group together. The few blocks left are
+# placed greedily on the buses, the block most tied to those already placed
+# first, splitting a block back into its halves when it fits nowhere, and
+# buses left empty get blocks peeled off the others. Uncoarsening then
+# refines the assignment on every level by moving, or swapping, whole
+# blocks between buses.
+# Finally, single students are moved with their rowdy groups priced
+# exactly, which also splits up groups left whole where that pays.
+###########################################
+
+# Coarsening stops once there are at most this many blocks per bus
+BLOCKS_PER_BUS = 2
+
+# Rounds of block moves tried on every level while uncoarsening
+REFINE_PASSES = 4
+
+# Rounds of single student moves priced exactly, after uncoarsening
+POLISH_ROUNDS = 2
+
+# Buses a student is tried on, besides the emptiest one, and the students of a full one tried as swaps
+TARGET_BUSES = 2
+SWAP_CANDIDATES = 4
+
+# adjacency[c] maps each neighbor block of c to the number of friendships between them,
+# inner[c] is twice the number of friendships between students of c, members[c] lists
+# the students of c and block_of[s] is the block of student s
+Level = namedtuple('Level', ['adjacency', 'inner', 'weights', 'trackers', 'members', 'children', 'block_of'])
+
+
+def finest_level(neighbors, rowdy):
+    num_students = len(neighbors)
+    adjacency = [dict.fromkeys(neighbors[s], 1) for s in range(num_students)]
+    trackers = [rowdy.tracker([s]) for s in range(num_students)]
+    members = [[s] for s in range(num_students)]
+    return Level(adjacency, [0] * num_students, [1] * num_students, trackers, members, None, list(range(num_students)))
+
+
+def coarsen(level, bus_size):
+    '''
+        Heavy edge matching of the blocks of a level
+
+        Outputs:
+            (parent, count)
+            parent - the block of the next level each block of this level goes into
+            count - the number of blocks of the next level
+    '''
+    adjacency, weights, trackers = level.adjacency, level.weights, level.trackers
+    parent = [-1] * len(weights)
+    count = 0
+    for block in sorted(range(len(weights)), key=lambda c: (len(adjacency[c]), c)):
+        if parent[block] != -1:
+            continue
+        parent[block] = count
+        candidates = sorted((-friends, weights[other], other) for other, friends in adjacency[block].items()
+                            if parent[other] == -1 and weights[block] + weights[other] <= bus_size)
+        for _, _, other in candidates:
+            if not trackers[block].joins_group(trackers[other]):
+                parent[other] = count
+                break
+        count += 1
+    return parent, count
+
+
+def contract(level, parent, count, rowdy):
+    '''
+        Builds the next level from a matching of the blocks of level
+    '''
+    adjacency = [{} for _ in range(count)]
+    inner = [0] * count
+    weights = [0] * count
+    trackers = [rowdy.tracker() for _ in range(count)]
+    members = [[] for _ in range(count)]
+    children = [[] for _ in range(count)]
+    for block in range(len(level.weights)):
+        p = parent[block]
+        inner[p] += level.inner[block]
+        weights[p] += level.weights[block]
+        trackers[p].update(level.trackers[block])
+        members[p].extend(level.members[block])
+        children[p].append(block)
+        row = adjacency[p]
+        for other, friends in level.adjacency[block].items():
+            q = parent[other]
+            if q != p:
+                row[q] = row.get(q, 0) + friends
+            else:
+                # seen once from either side
+                inner[p] += friends
+    block_of = [parent[block] for block in level.block_of]
+    return Level(adjacency, inner, weights, trackers, members, children, block_of)
+
+
+class Partition:
+    '''
+        A bus assignment of the students, built and refined a block of students at a time
+
+        Inputs:
+            neighbors - a list holding the friends of every student 0..n-1, without self-loops
+            num_buses - an integer representing the number of buses you can allocate to
+            bus_size - an integer representing the number of students that can fit on a bus
+            rowdy - the RowdyIndex of the rowdy groups
+    '''
+
+    def __init__(self, neighbors, num_buses, bus_size, rowdy):
+        self.neighbors = neighbors
+        self.rowdy = rowdy
+        self.num_buses = num_buses
+        self.bus_size = bus_size
+        self.bus_of = [-1] * len(neighbors)
+        self.sizes = [0] * num_buses
+        self.members = [set() for _ in range(num_buses)]
+        self.trackers = [rowdy.tracker() for _ in range(num_buses)]
+        # friends[s][bus] is the number of friends student s has on bus
+        self.friends = [[0] * num_buses for _ in range(len(neighbors))]
+
+    def connections(self, students, block_of, block):
+        '''
+            Returns a dict from each bus to the number of friendships students have on it,
+            leaving out the friendships inside block
+        '''
+        counts = {}
+        bus_of = self.bus_of
+        for s in students:
+            for u in self.neighbors[s]:
+                if block_of[u] != block:
+                    bus = bus_of[u]
+                    if bus != -1:
+                        counts[bus] = counts.get(bus, 0) + 1
+        return counts
+
+    def bus_of_block(self, students):
+        '''
+            Returns the bus of a block, or -1 if its students are not all on one bus
+        '''
+        bus = self.bus_of[students[0]]
+        for s in students:
+            if self.bus_of[s] != bus:
+                return -1
+        return bus
+
+    def _count_friends(self, students, source, bus):
+        friends = self.friends
+        for s in students:
+            for u in self.neighbors[s]:
+                row = friends[u]
+                if source != -1:
+                    row[source] -= 1
+                row[bus] += 1
+
+    def place(self, students, tracker, bus):
+        self._count_friends(students, self.bus_of[students[0]], bus)
+        for s in students:
+            self.bus_of[s] = bus
+        self.members[bus].update(students)
+        self.sizes[bus] += len(students)
+        self.trackers[bus].update(tracker)
+
+    def move(self, students, tracker, bus):
+        source = self.bus_of[students[0]]
+        self.members[source].difference_update(students)
+        self.sizes[source] -= len(students)
+        self.trackers[source].subtract(tracker)
+        self.place(students, tracker, bus)
+
+
+def place_block(levels, depth, block, partition):
+    '''
+        Puts a block on the bus it has the most friends on, or the emptiest bus if it has none,
+        among the buses with room which it would not make rowdy. A block which fits nowhere
+        is split into the blocks it was made of.
+    '''
+    level = levels[depth]
+    students = level.members[block]
+    tracker = level.trackers[block]
+    weight = level.weights[block]
+    connections = partition.connections(students, level.block_of, block)
+
+    best = None
+    rowdy_best = None
+    for bus in range(partition.num_buses):
+        if partition.sizes[bus] + weight > partition.bus_size:
+            continue
+        key = (connections.get(bus, 0), -partition.sizes[bus], -bus)
+        if partition.trackers[bus].joins_group(tracker):
+            if rowdy_best is None or key > rowdy_best[0]:
+                rowdy_best = (key, bus)
+        elif best is None or key > best[0]:
+            best = (key, bus)
+
+    if best is None and depth > 0:
+        for child in level.children[block]:
+            place_block(levels, depth - 1, child, partition)
+        return
+    if best is None:
+        best = rowdy_best
+    if best is None:
+        raise ValueError("the students do not fit on the buses")
+    partition.place(students, tracker, best[1])
+
+
+def place_blocks(levels, partition):
+    '''
+        Places the blocks of the coarsest level, always taking next the block with the most
+        friendships to the blocks already placed, then the heaviest and most rowdy one
+    '''
+    coarsest = levels[-1]
+    depth = len(levels) - 1
+    placed = [False] * len(coarsest.weights)
+    attached = [0] * len(coarsest.weights)
+
+    def key(block):
+        return (-attached[block], -coarsest.weights[block], -len(coarsest.trackers[block].counts), block)
+
+    queue = [key(block) for block in range(len(coarsest.weights))]
+    heapq.heapify(queue)
+    while queue:
+        entry = heapq.heappop(queue)
+        block = entry[-1]
+        if placed[block] or entry != key(block):
+            continue
+        placed[block] = True
+        place_block(levels, depth, block, partition)
+        for other, friends in coarsest.adjacency[block].items():
+            if not placed[other]:
+                attached[other] += friends
+                heapq.heappush(queue, key(other))
+
+
+def peel_plan(level, partition, count):
+    '''
+        Picks count blocks of level to move onto empty buses, always the block with the fewest
+        friendships left on its own bus, counting the blocks picked so far, so bits of the
+        graph hanging off a bus are peeled off one block at a time
+
+        Outputs:
+            (lost, blocks)
+            lost - the number of friendships the moves cut, or None if count blocks could not be found
+            blocks - the blocks to move
+    '''
+    num_blocks = len(level.weights)
+    bus_of = [partition.bus_of_block(level.members[block]) for block in range(num_blocks)]
+    sizes = list(partition.sizes)
+    friends = [sum(w for other, w in level.adjacency[block].items() if bus_of[other] == bus_of[block])
+               for block in range(num_blocks)]
+    queue = [(friends[block], block) for block in range(num_blocks) if bus_of[block] != -1]
+    heapq.heapify(queue)
+    moved = [False] * num_blocks
+    lost = 0
+    blocks = []
+    while len(blocks) < count and queue:
+        cut, block = heapq.heappop(queue)
+        source = bus_of[block]
+        if moved[block] or cut != friends[block] or sizes[source] - level.weights[block] < 1:
+            continue
+        moved[block] = True
+        sizes[source] -= level.weights[block]
+        lost += cut
+        blocks.append(block)
+        for other, w in level.adjacency[block].items():
+            if bus_of[other] == source and not moved[other]:
+                friends[other] -= w
+                heapq.heappush(queue, (friends[other], other))
+    if len(blocks) < count:
+        return None, blocks
+    return lost, blocks
+
+
+def fill_empty_buses(levels, partition):
+    '''
+        Gives every empty bus a block peeled off another bus, peeling either blocks of the
+        coarsest level or single students, whichever cuts fewer friendships
+    '''
+    empty = [bus for bus in range(partition.num_buses) if not partition.sizes[bus]]
+    if not empty:
+        return
+    plans = []
+    for level in (levels[-1], levels[0]):
+        lost, blocks = peel_plan(level, partition, len(empty))
+        if lost is not None:
+            plans.append((lost, len(plans), level, blocks))
+    if not plans:
+        raise ValueError("there are fewer students than buses")
+    _, _, level, blocks = min(plans)
+    for block, bus in zip(blocks, empty):
+        partition.move(level.members[block], level.trackers[block], bus)
+
+
+def try_swap(level, partition, block, source, bus, gain):
+    '''
+        Swaps block with the block of bus which gains the most friendships by the swap, if that
+        keeps both buses within size and makes neither rowdy. Returns the number of friendships
+        gained, 0 if there was no such swap.
+    '''
+    students = level.members[block]
+    tracker = level.trackers[block]
+    weight = level.weights[block]
+    sizes = partition.sizes
+    block_of = level.block_of
+    # friendships between block and each block of bus, which stay cut by a swap
+    between = {}
+    for s in students:
+        for u in partition.neighbors[s]:
+            if partition.bus_of[u] == bus:
+                between[block_of[u]] = between.get(block_of[u], 0) + 1
+
+    candidates = []
+    friends = partition.friends
+    for other in set(block_of[u] for u in partition.members[bus]):
+        other_students = level.members[other]
+        other_weight = level.weights[other]
+        if sizes[source] - weight + other_weight > partition.bus_size or sizes[bus] - other_weight + weight > partition.bus_size:
+            continue
+        if partition.bus_of_block(other_students) != bus:
+            continue
+        to_source = sum(friends[u][source] for u in other_students)
+        to_bus = sum(friends[u][bus] for u in other_students) - level.inner[other]
+        total = gain + to_source - to_bus - 2 * between.get(other, 0)
+        if total > 0:
+            candidates.append((-total, other))
+
+    source_tracker = partition.trackers[source]
+    bus_tracker = partition.trackers[bus]
+    for total, other in sorted(candidates):
+        other_tracker = level.trackers[other]
+        source_tracker.subtract(tracker)
+        bus_tracker.subtract(other_tracker)
+        rowdy = source_tracker.joins_group(other_tracker) or bus_tracker.joins_group(tracker)
+        source_tracker.update(tracker)
+        bus_tracker.update(other_tracker)
+        if not rowdy:
+            partition.move(students, tracker, bus)
+            partition.move(level.members[other], other_tracker, source)
+            return -total
+    return 0
+
+
+def refine(level, partition, passes=REFINE_PASSES):
+    '''
+        Moves whole blocks of a level to the bus they have the most friends on while that
+        keeps more friendships. A block whose best bus is full is swapped with a block of
+        that bus instead when that keeps more friendships.
+    '''
+    sizes = partition.sizes
+    for _ in range(passes):
+        gained = 0
+        for block in range(len(level.weights)):
+            students = level.members[block]
+            source = partition.bus_of_block(students)
+            if source == -1:
+                continue
+            weight = level.weights[block]
+            tracker = level.trackers[block]
+            connections = partition.connections(students, level.block_of, block)
+            inside = connections.get(source, 0)
+            targets = sorted((inside - friends, bus) for bus, friends in connections.items() if friends > inside)
+            for loss, bus in targets:
+                if sizes[bus] + weight <= partition.bus_size:
+                    if sizes[source] - weight < 1 or partition.trackers[bus].joins_group(tracker):
+                        continue
+                    partition.move(students, tracker, bus)
+                    gained -= loss
+                    break
+            else:
+                # swaps are only tried with the best bus, they cost a scan of its blocks
+                if targets and sizes[targets[0][1]] + weight > partition.bus_size:
+                    gained += try_swap(level, partition, block, source, targets[0][1], -targets[0][0])
+        if not gained:
+            break
+
+
+def polish(instance, buses, rounds=POLISH_ROUNDS):
+    '''
+        Moves single students between buses, pricing every move exactly like score_output,
+        rowdy groups included. A student with more friends on another bus than on their
+        own, or in a rowdy group left whole, is moved to the bus of most friends or the
+        emptiest bus, or swapped with a student of a full bus, whichever keeps the most
+        friendships, if that keeps more than staying.
+    '''
+    state = AssignmentState(instance, buses)
+    riders = [set(bus) for bus in buses]
+    # inside[s] is the number of friends student s has on their own bus
+    inside = [sum(1 for u in state.neighbors[s] if u != s and state.bus_of[u] == state.bus_of[s])
+              for s in range(len(state.bus_of))]
+
+    def relocate(student, bus):
+        source = state.bus_of[student]
+        riders[source].remove(student)
+        riders[bus].add(student)
+        count = 0
+        for u in state.neighbors[student]:
+            if u == student:
+                continue
+            if state.bus_of[u] == source:
+                inside[u] -= 1
+            elif state.bus_of[u] == bus:
+                inside[u] += 1
+                count += 1
+        inside[student] = count
+        return state.move(student, bus)
+
+    def friends_by_bus(student):
+        counts = {}
+        for u in state.neighbors[student]:
+            if u != student:
+                counts[state.bus_of[u]] = counts.get(state.bus_of[u], 0) + 1
+        return counts
+
+    for _ in range(rounds):
+        gained = 0
+        for student in range(len(state.bus_of)):
+            bus = state.bus_of[student]
+            counts = friends_by_bus(student)
+            own = counts.pop(bus, 0)
+            targets = sorted(counts, key=lambda t: (-counts[t], t))[:TARGET_BUSES]
+            if not state.dead[student] and not (targets and counts[targets[0]] > own):
+                continue
+            targets.append(min(range(state.num_buses), key=lambda t: (state.sizes[t], t)))
+
+            best_change, best = 0, None
+            for target in targets:
+                if target == bus:
+                    continue
+                if state.sizes[target] < state.size_bus:
+                    if state.sizes[bus] < 2:
+                        continue
+                    change = state.move_change(student, target)
+                    if change > best_change:
+                        best_change, best = change, (target, None)
+                    continue
+                others = sorted(riders[target], key=lambda u: (inside[u], u))[:SWAP_CANDIDATES]
+                for other in others:
+                    change = state.move(student, target)
+                    change += state.move_change(other, bus)
+                    state.move(student, bus)
+                    if change > best_change:
+                        best_change, best = change, (target, other)
+
+            if best is not None:
+                target, other = best
+                relocate(student, target)
+                if other is not None:
+                    relocate(other, bus)
+                gained += best_change
+        if not gained:
+            break
+    return state.solution()
+
+
+def solve(graph, num_buses, bus_size, constraints):
+    '''
+        Multilevel solver, see the description at the top of this file
+    '''
+    instance = graph_instance(graph, num_buses, bus_size, constraints)
+    num_students = len(instance.labels)
+    indptr = instance.indptr.tolist()
+    indices = instance.indices.tolist()
+    neighbors = [[u for u in indices[indptr[s]:indptr[s + 1]] if u != s] for s in range(num_students)]
+    rowdy = RowdyIndex(instance)
+
+    levels = [finest_level(neighbors, rowdy)]
+    while len(levels[-1].weights) > BLOCKS_PER_BUS * num_buses:
+        size = len(levels[-1].weights)
+        parent, count = coarsen(levels[-1], bus_size)
+        if count == size:
+            break
+        levels.append(contract(levels[-1], parent, count, rowdy))
+        if count > 0.95 * size:
+            break
+
+    partition = Partition(neighbors, num_buses, bus_size, rowdy)
+    place_blocks(levels, partition)
+    fill_empty_buses(levels, partition)
+
+    for level in reversed(levels):
+        refine(level, partition)
+
+    return polish(instance, [sorted(bus) for bus in partition.members])
+
+
+def main():
+    '''
+        Main method which iterates over all inputs and calls `solve` on each.
+        The student should modify `solve` to return their solution and modify
+        the portion which writes it to a file to make sure their output is
+        formatted correctly.
+    '''
+    size_categories = ["large"]
+    if not os.path.isdir(path_to_outputs):
+        os.mkdir(path_to_outputs)
+
+    for size in size_categories:
+        category_path = path_to_inputs + "/" + size
+        output_category_path = path_to_outputs + "/" + size
+        category_dir = os.fsencode(category_path)
+
+        if not os.path.isdir(output_category_path):
+            os.mkdir(output_category_path)
+
+        parse = input_parser(category_path)
+
+        for input_folder in os.listdir(category_dir):
+            input_name = os.fsdecode(input_folder)
+            graph, num_buses, size_bus, constraints = parse(input_name)
+            print('solving', size, input_name)
+            solution = solve(graph, num_buses, size_bus, constraints)
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
+
+if __name__ == '__main__':
+    main()
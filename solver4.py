@@ -0,0 +1,240 @@
+import os
+
+import numpy as np
+
+from corpus_pack import input_parser
+from instance_cache import csr_ranges, graph_instance, shared_groups, write_output
+
+###########################################
+# Change this variable to the path to
+# the folder containing all three input
+# size category folders
+###########################################
+path_to_inputs = "./all_inputs"
+
+###########################################
+# Change this variable if you want
+# your outputs to be put in a
+# different folder
+###########################################
+path_to_outputs = "./all_outputs"
+
+###########################################
+# Label propagation solver.
+#
+# Buses start from num_buses seeds, high degree students with no seed
+# among their friends. Every round a random half of the students look at
+# the buses of their friends and want to move to the bus they have the
+# most friends on, a bus which would put a whole rowdy group together
+# counting as ROWDY_PENALTY friendships less. Moves are admitted best
+# first until each bus is full. Everything works on the CSR arrays of the
+# instance, a round costs a sort of the friendships, so graphs with 10^5
+# students take well under a second.
+# Students no friend led anywhere fill the emptiest buses, and buses still
+# empty at the end get the loneliest students of the fullest ones.
+###########################################
+
+# Rounds of propagation, stopping early once nobody moves
+MAX_ROUNDS = 20
+
+# Share of the students updated in a round, updating everyone at once lets labels oscillate
+UPDATE_FRACTION = 0.5
+
+# Friendships a bus is charged for putting a whole rowdy group together
+ROWDY_PENALTY = 10 ** 6
+
+
+def pick_seeds(indptr, indices, num_buses, rng):
+    '''
+        Returns num_buses students, highest degree first among those who are not friends
+        of a seed, topped up with random students if there are not enough of them
+    '''
+    num_students = len(indptr) - 1
+    degree = np.diff(indptr)
+    blocked = np.zeros(num_students, dtype=bool)
+    seeds = []
+    for student in np.argsort(-degree, kind='stable').tolist():
+        if len(seeds) == num_buses:
+            break
+        if not blocked[student]:
+            seeds.append(student)
+            blocked[student] = True
+            blocked[indices[indptr[student]:indptr[student + 1]]] = True
+    if len(seeds) < num_buses:
+        rest = np.setdiff1d(np.arange(num_students), seeds)
+        seeds.extend(rng.choice(rest, num_buses - len(seeds), replace=False).tolist())
+    return np.array(seeds)
+
+
+def forbidden_labels(labels, group_members, group_starts, group_sizes, group_of):
+    '''
+        Returns (students, buses) such that students[i] getting on, or staying on, buses[i]
+        would put every student of one of their rowdy groups on it
+    '''
+    if not len(group_members):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    member_labels = labels[group_members]
+    lowest = np.minimum.reduceat(member_labels, group_starts)
+    highest = np.maximum.reduceat(member_labels, group_starts)
+    lowest_count = np.add.reduceat((member_labels == lowest[group_of]).astype(np.int64), group_starts)
+    highest_count = np.add.reduceat((member_labels == highest[group_of]).astype(np.int64), group_starts)
+
+    # all the others of a group share a bus when the whole group does, or when the
+    # student is the only one of their group on another bus
+    together = lowest[group_of] == highest[group_of]
+    joins_lowest = (lowest_count[group_of] == group_sizes[group_of] - 1) & (member_labels == highest[group_of])
+    joins_highest = (highest_count[group_of] == group_sizes[group_of] - 1) & (member_labels == lowest[group_of])
+    buses = np.where(together | joins_lowest, lowest[group_of], highest[group_of])
+    hit = (together | joins_lowest | joins_highest) & (buses >= 0)
+    return group_members[hit], buses[hit]
+
+
+def propagate(instance, rng=None):
+    '''
+        Runs label propagation on an Instance
+
+        Inputs:
+            instance - an instance_cache.Instance
+            rng - a numpy Generator
+
+        Outputs:
+            an integer array holding the bus of every student
+    '''
+    rng = rng if rng is not None else np.random.default_rng()
+    num_students = len(instance.labels)
+    num_buses = instance.num_buses
+    size_bus = instance.size_bus
+    indptr, indices = instance.indptr, instance.indices
+    degree = np.diff(indptr)
+
+    # the rowdy groups of two or more students, as members sorted by group
+    group_ptr, group_members, _, _, _ = shared_groups(instance)
+    group_sizes = np.diff(group_ptr)
+    group_starts = group_ptr[:-1]
+    group_of = np.repeat(np.arange(len(group_sizes)), group_sizes)
+
+    labels = np.full(num_students, -1, dtype=np.int64)
+    labels[pick_seeds(indptr, indices, num_buses, rng)] = np.arange(num_buses)
+    sizes = np.ones(num_buses, dtype=np.int64)
+
+    # only students whose friends moved, who were turned away or who keep a rowdy
+    # group whole can want to move, the others are skipped
+    candidates = np.ones(num_students, dtype=bool)
+    for _ in range(MAX_ROUNDS):
+        students, buses = forbidden_labels(labels, group_members, group_starts, group_sizes, group_of)
+        forbidden_keys = students * num_buses + buses
+        stuck = np.zeros(num_students, dtype=bool)
+        stuck[students[buses == labels[students]]] = True
+        candidates |= stuck
+        active = np.flatnonzero(candidates & (rng.random(num_students) < UPDATE_FRACTION))
+        if not candidates.any():
+            break
+        candidates[active] = False
+
+        # friends of every active student on every bus, as sorted keys student * num_buses + bus
+        lengths = degree[active]
+        heads = np.repeat(active, lengths)
+        tails = indices[csr_ranges(indptr[active], lengths)]
+        friend_labels = labels[tails]
+        counted = (friend_labels >= 0) & (heads != tails)
+        keys, counts = np.unique(heads[counted] * num_buses + friend_labels[counted], return_counts=True)
+        if not len(keys):
+            continue
+        owners = keys // num_buses
+        scores = counts - ROWDY_PENALTY * np.isin(keys, forbidden_keys)
+
+        # the best bus of every active student, ties broken at random
+        jittered = scores + rng.random(len(keys)) * 0.5
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        best = np.maximum.reduceat(jittered, starts)
+        picks = np.flatnonzero(jittered == np.repeat(best, np.diff(np.r_[starts, len(keys)])))
+        movers = owners[picks]
+        targets = keys[picks] % num_buses
+
+        # unlabeled students take any bus that is not forbidden, the others only a better one
+        same = counted & (friend_labels == labels[heads])
+        own = np.bincount(heads[same], minlength=num_students) - ROWDY_PENALTY * stuck
+        unlabeled = labels[movers] < 0
+        gains = np.where(unlabeled, scores[picks], scores[picks] - own[movers])
+        wanted = (targets != labels[movers]) & (gains > 0)
+        movers, targets, gains = movers[wanted], targets[wanted], gains[wanted]
+
+        # admit the best moves onto every bus while it has room
+        order = np.lexsort((-gains, targets))
+        movers, targets = movers[order], targets[order]
+        firsts = np.searchsorted(targets, targets)
+        admitted = np.arange(len(targets)) - firsts < size_bus - sizes[targets]
+        candidates[movers[~admitted]] = True
+        movers, targets = movers[admitted], targets[admitted]
+        leaving = labels[movers]
+        labels[movers] = targets
+        sizes += np.bincount(targets, minlength=num_buses)
+        sizes -= np.bincount(leaving[leaving >= 0], minlength=num_buses)
+        candidates[indices[csr_ranges(indptr[movers], degree[movers])]] = True
+
+    # students no friend led anywhere fill the emptiest buses
+    unlabeled = np.flatnonzero(labels < 0)
+    if len(unlabeled):
+        by_size = np.argsort(sizes, kind='stable')
+        slots = np.repeat(by_size, size_bus - sizes[by_size])
+        labels[unlabeled] = slots[:len(unlabeled)]
+        sizes += np.bincount(labels[unlabeled], minlength=num_buses)
+
+    # empty buses get the loneliest students of the fullest buses
+    empty = np.flatnonzero(sizes == 0)
+    if len(empty):
+        heads = np.repeat(np.arange(num_students), degree)
+        tails = indices
+        inside = np.bincount(heads[labels[heads] == labels[tails]], minlength=num_students)
+        order = np.lexsort((inside, labels))
+        bus_order = labels[order]
+        ranks = np.arange(num_students) - np.searchsorted(bus_order, bus_order)
+        # every bus keeps a student, the loneliest of each bus go first, fullest buses first
+        donors = ranks < sizes[bus_order] - 1
+        order, ranks, donor_sizes = order[donors], ranks[donors], sizes[bus_order[donors]]
+        donors = order[np.lexsort((-donor_sizes, ranks))]
+        labels[donors[:len(empty)]] = empty
+    return labels
+
+
+def solve(graph, num_buses, bus_size, constraints):
+    '''
+        Label propagation solver, see the description at the top of this file
+    '''
+    instance = graph_instance(graph, num_buses, bus_size, constraints)
+    labels = propagate(instance)
+    buses = [[] for _ in range(num_buses)]
+    for student, bus in enumerate(labels.tolist()):
+        buses[bus].append(student)
+    return buses
+
+
+def main():
+    '''
+        Main method which iterates over all inputs and calls `solve` on each.
+        The student should modify `solve` to return their solution and modify
+        the portion which writes it to a file to make sure their output is
+        formatted correctly.
+    '''
+    size_categories = ["small", "medium", "large"]
+    if not os.path.isdir(path_to_outputs):
+        os.mkdir(path_to_outputs)
+
+    for size in size_categories:
+        category_path = path_to_inputs + "/" + size
+        output_category_path = path_to_outputs + "/" + size
+        category_dir = os.fsencode(category_path)
+
+        if not os.path.isdir(output_category_path):
+            os.mkdir(output_category_path)
+
+        parse = input_parser(category_path)
+
+        for input_folder in os.listdir(category_dir):
+            input_name = os.fsdecode(input_folder)
+            graph, num_buses, size_bus, constraints = parse(input_name)
+            solution = solve(graph, num_buses, size_bus, constraints)
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+
+from corpus_pack import input_parser
+from instance_cache import graph_instance, write_output
+from spectral import spectral_assignment
+
+###########################################
+# Change this variable to the path to
+# the folder containing all three input
+# size category folders
+###########################################
+path_to_inputs = "./all_inputs"
+
+###########################################
+# Change this variable if you want
+# your outputs to be put in a
+# different folder
+###########################################
+path_to_outputs = "./all_outputs"
+
+###########################################
+# Spectral solver.
+#
+# Students are embedded with a few eigenvectors of the normalized
+# friendship graph, clustered into buses by k-means that fills every bus
+# up to its size, and rowdy groups left whole are broken up, see
+# spectral.py.
+###########################################
+
+
+def solve(graph, num_buses, bus_size, constraints):
+    '''
+        Spectral solver, see the description at the top of this file
+    '''
+    instance = graph_instance(graph, num_buses, bus_size, constraints)
+    return spectral_assignment(instance)
+
+
+def main():
+    '''
+        Main method which iterates over all inputs and calls `solve` on each.
+        The student should modify `solve` to return their solution and modify
+        the portion which writes it to a file to make sure their output is
+        formatted correctly.
+    '''
+    size_categories = ["small", "medium", "large"]
+    if not os.path.isdir(path_to_outputs):
+        os.mkdir(path_to_outputs)
+
+    for size in size_categories:
+        category_path = path_to_inputs + "/" + size
+        output_category_path = path_to_outputs + "/" + size
+        category_dir = os.fsencode(category_path)
+
+        if not os.path.isdir(output_category_path):
+            os.mkdir(output_category_path)
+
+        parse = input_parser(category_path)
+
+        for input_folder in os.listdir(category_dir):
+            input_name = os.fsdecode(input_folder)
+            graph, num_buses, size_bus, constraints = parse(input_name)
+            solution = solve(graph, num_buses, size_bus, constraints)
+            write_output(output_category_path + "/" + input_name + ".out", solution, graph.graph["labels"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+import os
+import time
+
+import numpy as np
+
+from checkpoint import OutputCheckpoint
+from corpus_pack import input_parser
+from instance_cache import graph_instance, shared_groups
+from tempering import anneal
+
+###########################################
+# Change this variable to the path to
+# the folder containing all three input
+# size category folders
+###########################################
+path_to_inputs = "./all_inputs"
+
+###########################################
+# Change this variable if you want
+# your outputs to be put in a
+# different folder
+###########################################
+path_to_outputs = "./all_outputs"
+
+###########################################
+# Branch and bound solver, for small inputs.
+#
+# Students are put on buses one at a time, the best connected first. All
+# buses are alike, so a student only ever opens the first empty bus rather
+# than any of them. Kept friendships are counted exactly as students are
+# placed, including the friendships lost when the last student of a rowdy
+# group joins the others. A branch is cut when even the best case left,
+# where every student still to place joins the bus where they keep the
+# most friendships, counting their placed friends on it and as many of
+# their friends still to place as it has room for, cannot beat the best
+# assignment found so far, or when too few students are left to fill the
+# empty buses. Rowdy groups tighten the bound: placed students of a group
+# completed on their bus no longer count as anyone's friends, and a student
+# whose group has every other student on one bus keeps nothing there.
+# The search starts from an annealed assignment and stops at the time
+# budget, returning the best assignment and an upper bound on the best
+# score, which is the score itself once the search is complete.
+###########################################
+
+# Seconds a search may take in all
+TIME_BUDGET = 10.0
+
+# Share of the time budget spent annealing a first assignment to beat
+SEED_SHARE = 0.25
+
+
+class BranchAndBound:
+    '''
+        Search state for one instance
+
+        Inputs:
+            instance - an instance_cache.Instance
+            callback - called with every better assignment found
+    '''
+
+    def __init__(self, instance, callback=None):
+        num_students = len(instance.labels)
+        self.num_buses = instance.num_buses
+        self.size_bus = instance.size_bus
+        self.num_edges = len(instance.edges)
+
+        group_ptr, group_members, member_ptr, member_groups, lonely = shared_groups(instance)
+        group_ptr = group_ptr.tolist()
+        group_members = group_members.tolist()
+        self.groups = [group_members[group_ptr[g]:group_ptr[g + 1]] for g in range(len(group_ptr) - 1)]
+        member_ptr = member_ptr.tolist()
+        member_groups = member_groups.tolist()
+        self.memberships = [member_groups[member_ptr[s]:member_ptr[s + 1]] for s in range(num_students)]
+        # students of a rowdy group of one never count
+        lonely = set(np.flatnonzero(lonely).tolist())
+
+        indptr = instance.indptr.tolist()
+        indices = instance.indices.tolist()
+        self.neighbors = []
+        self.loops = []
+        for s in range(num_students):
+            friends = [] if s in lonely else [u for u in indices[indptr[s]:indptr[s + 1]] if u not in lonely]
+            self.neighbors.append([u for u in friends if u != s])
+            self.loops.append(1 if s in friends else 0)
+
+        # the best connected students first, then those with the most friends already placed
+        self.order = []
+        placed = [0] * num_students
+        remaining = set(range(num_students))
+        while remaining:
+            student = max(remaining, key=lambda s: (placed[s], len(self.neighbors[s]), -s))
+            remaining.remove(student)
+            self.order.append(student)
+            for u in self.neighbors[student]:
+                placed[u] += 1
+
+        self.bus_of = [-1] * num_students
+        self.sizes = [0] * self.num_buses
+        self.occupancy = [{} for _ in self.groups]
+        self.placed_members = [0] * len(self.groups)
+        self.dead = [0] * num_students
+        self.kept = 0
+        # friends[s, b] counts the placed friends of s on bus b outside completed rowdy groups
+        self.friends = np.zeros((num_students, self.num_buses), dtype=np.int64)
+        self.unplaced_friends = np.array([len(friends) for friends in self.neighbors], dtype=np.int64)
+        self.unplaced = np.ones(num_students, dtype=bool)
+        self.loop_total = np.array(self.loops, dtype=np.int64)
+
+        self.callback = callback
+        self.best = -1
+        self.best_bus_of = None
+        self.open_bound = -1
+        self.nodes = 0
+
+    def _edges_on_bus(self, student):
+        '''
+            Returns the kept friendships between a placed, living student and the others on their bus
+        '''
+        bus = self.bus_of[student]
+        count = self.loops[student]
+        for u in self.neighbors[student]:
+            if self.bus_of[u] == bus and not self.dead[u]:
+                count += 1
+        return count
+
+    def place(self, student, bus):
+        '''
+            Puts student on bus and returns the rowdy groups it completed
+        '''
+        self.bus_of[student] = bus
+        self.sizes[bus] += 1
+        self.friends[self.neighbors[student], bus] += 1
+        self.unplaced_friends[self.neighbors[student]] -= 1
+        self.unplaced[student] = False
+        if not self.dead[student]:
+            self.kept += self._edges_on_bus(student)
+
+        completed = []
+        for g in self.memberships[student]:
+            occupancy = self.occupancy[g]
+            occupancy[bus] = occupancy.get(bus, 0) + 1
+            self.placed_members[g] += 1
+            if occupancy[bus] == len(self.groups[g]):
+                for u in self.groups[g]:
+                    if not self.dead[u]:
+                        self.kept -= self._edges_on_bus(u)
+                        self.friends[self.neighbors[u], bus] -= 1
+                    self.dead[u] += 1
+                completed.append(g)
+        return completed
+
+    def unplace(self, student, completed, kept):
+        '''
+            Takes student back off their bus, undoing a place which returned completed
+            when kept friendships were counted
+        '''
+        bus = self.bus_of[student]
+        for g in completed:
+            for u in self.groups[g]:
+                self.dead[u] -= 1
+                if not self.dead[u]:
+                    self.friends[self.neighbors[u], bus] += 1
+        for g in self.memberships[student]:
+            occupancy = self.occupancy[g]
+            occupancy[bus] -= 1
+            self.placed_members[g] -= 1
+        self.kept = kept
+        self.bus_of[student] = -1
+        self.sizes[bus] -= 1
+        self.friends[self.neighbors[student], bus] -= 1
+        self.unplaced_friends[self.neighbors[student]] += 1
+        self.unplaced[student] = True
+
+    def bound(self, opened):
+        '''
+            Returns an upper bound on the friendships any completion of the current placement keeps.
+            A student still to place keeps at most their placed friends on the bus they join, and
+            at most as many friends still to place as that bus has room for besides them.
+        '''
+        unplaced = self.unplaced
+        if not unplaced.any():
+            return self.kept
+        room = self.size_bus - np.array(self.sizes[:opened] + [0] * (opened < self.num_buses))
+        open_buses = np.flatnonzero(room > 0)
+        friends = self.friends[unplaced][:, open_buses]
+        among = np.minimum(self.unplaced_friends[unplaced][:, None], room[open_buses][None, :] - 1)
+        values = 2 * friends + among
+
+        # the last student of a rowdy group whose others all share a bus would complete it there
+        rows = np.cumsum(unplaced) - 1
+        columns = np.full(self.num_buses, -1)
+        columns[open_buses] = np.arange(len(open_buses))
+        for g, group in enumerate(self.groups):
+            if self.placed_members[g] != len(group) - 1:
+                continue
+            for bus, count in self.occupancy[g].items():
+                if count == len(group) - 1 and columns[bus] >= 0:
+                    student = next(u for u in group if self.bus_of[u] < 0)
+                    values[rows[student], columns[bus]] = 0
+        best = values.max(axis=1)
+        return self.kept + int(best.sum()) // 2 + int(self.loop_total[unplaced].sum())
+
+    def search(self, depth, opened, deadline):
+        '''
+            Places the students from order[depth] on, with buses 0..opened-1 already used.
+            Returns False once the deadline has passed.
+        '''
+        self.nodes += 1
+        if depth == len(self.order):
+            if self.kept > self.best:
+                self.best = self.kept
+                self.best_bus_of = list(self.bus_of)
+                if self.callback is not None:
+                    self.callback(self.solution())
+            return True
+
+        bound = self.bound(opened)
+        if bound <= self.best:
+            return True
+        if self.nodes % 256 == 0 and time.perf_counter() > deadline:
+            self.open_bound = max(self.open_bound, bound)
+            return False
+
+        student = self.order[depth]
+        left = len(self.order) - depth - 1
+        buses = [b for b in range(opened) if self.sizes[b] < self.size_bus]
+        buses.sort(key=lambda b: -self.friends[student, b])
+        if opened < self.num_buses:
+            buses.append(opened)
+        for bus in buses:
+            now_opened = max(opened, bus + 1)
+            # the students left must be enough to fill the buses still empty
+            if left < self.num_buses - now_opened:
+                continue
+            kept = self.kept
+            completed = self.place(student, bus)
+            finished = self.search(depth + 1, now_opened, deadline)
+            self.unplace(student, completed, kept)
+            if not finished:
+                self.open_bound = max(self.open_bound, self.branch_bound(student, buses[buses.index(bus) + 1:], opened))
+                return False
+        return True
+
+    def branch_bound(self, student, buses, opened):
+        '''
+            Returns the highest bound among the branches putting student on one of buses
+        '''
+        highest = -1
+        for bus in buses:
+            kept = self.kept
+            completed = self.place(student, bus)
+            highest = max(highest, self.bound(max(opened, bus + 1)))
+            self.unplace(student, completed, kept)
+        return highest
+
+    def solution(self):
+        '''
+            Returns the best assignment found, a list of buses of students 0..n-1
+        '''
+        solution = [[] for _ in range(self.num_buses)]
+        for student, bus in enumerate(self.best_bus_of):
+            solution[bus].append(student)
+        return solution
+
+    def start_from(self, bus_of):
+        '''
+            Takes a valid assignment as the best one found so far
+        '''
+        placed = []
+        for student in self.order:
+            kept = self.kept
+            placed.append((student, self.place(student, bus_of[student]), kept))
+        self.best = self.kept
+        self.best_bus_of = list(bus_of)
+        for student, completed, kept in reversed(placed):
+            self.unplace(student, completed, kept)
+
+
+def branch_and_bound(graph, num_buses, size_bus, constraints, time_budget=TIME_BUDGET, callback=None):
+    '''
+        Searches for the best assignment of an input until time_budget seconds have passed
+
+        Inputs:
+            graph, num_buses, size_bus, constraints - an input, as returned by parse_input
+            time_budget - the number of seconds to search for
+            callback - called with every better assignment found on the way
+
+        Outputs:
+            (solution, score, bound)
+            solution - the best assignment found, a list of buses of students 0..n-1
+            score - its score, as computed by score_output
+            bound - an upper bound on the score of any assignment, equal to score if solution is optimal
+    '''
+    deadline = time.perf_counter() + time_budget
+    instance = graph_instance(graph, num_buses, size_bus, constraints)
+    search = BranchAndBound(instance, callback)
+
+    start, _ = anneal(instance, time_budget * SEED_SHARE, callback=callback)
+    if callback is not None:
+        callback(start)
+    bus_of = [0] * len(instance.labels)
+    for bus, students in enumerate(start):
+        for student in students:
+            bus_of[student] = bus
+    search.start_from(bus_of)
+
+    if search.search(0, 0, deadline):
+        bound = search.best
+    else:
+        bound = max(search.best, search.open_bound)
+
+    solution = search.solution()
+    if not search.num_edges:
+        return solution, 0, 0
+    return solution, search.best / search.num_edges, min(bound, search.num_edges) / search.num_edges
+
+
+def solve(graph, num_buses, bus_size, constraints, time_budget=TIME_BUDGET, callback=None):
+    '''
+        Branch and bound solver, see the description at the top of this file
+    '''
+    solution, score, bound = branch_and_bound(graph, num_buses, bus_size, constraints, time_budget, callback)
+    print('score', score, 'bound', bound)
+    return solution
+
+
+def main():
+    '''
+        Main method which iterates over all inputs and calls `solve` on each.
+        The student should modify `solve` to return their solution and modify
+        the portion which writes it to a file to make sure their output is
+        formatted correctly.
+    '''
+    size_categories = ["small"]
+    if not os.path.isdir(path_to_outputs):
+        os.mkdir(path_to_outputs)
+
+    for size in size_categories:
+        category_path = path_to_inputs + "/" + size
+        output_category_path = path_to_outputs + "/" + size
+        category_dir = os.fsencode(category_path)
+
+        if not os.path.isdir(output_category_path):
+            os.mkdir(output_category_path)
+
+        parse = input_parser(category_path)
+
+        for input_folder in os.listdir(category_dir):
+            input_name = os.fsdecode(input_folder)
+            graph, num_buses, size_bus, constraints = parse(input_name)
+            print('solving', size, input_name)
+            # the best assignment so far is kept on disk while searching
+            checkpoint = OutputCheckpoint(output_category_path + "/" + input_name + ".out", graph.graph["instance"])
+            solution = solve(graph, num_buses, size_bus, constraints, callback=checkpoint)
+            checkpoint(solution)
+            checkpoint.flush()
+
+if __name__ == '__main__':
+    main()
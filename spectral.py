@@ -0,0 +1,206 @@
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import ArpackError, ArpackNoConvergence, eigsh
+
+from repair_state import RepairState
+
+####################################################
+# Spectral clustering of students into buses.
+#
+# The students are embedded with the leading eigenvectors of the normalized
+# adjacency matrix D^-1/2 A D^-1/2, which are the bottom eigenvectors of
+# the normalized Laplacian, found by a sparse iterative eigensolver so no
+# dense n x n matrix is built unless that solver fails. The embedding is
+# clustered by k-means with one center per bus, where every round fills the
+# buses closest first up to their size. Clusters of friends tend to hold
+# whole rowdy groups, which are then broken up by moving the student who
+# keeps the most friendships elsewhere, swapping them with the loneliest
+# student of the other bus when it is full.
+####################################################
+
+# Most eigenvectors used for the embedding
+MAX_DIMENSIONS = 16
+
+# Rounds of k-means, stopping early once no student changes bus
+KMEANS_ROUNDS = 20
+
+# Rounds over the rowdy groups left whole, stopping early once one breaks none up
+BREAK_ROUNDS = 3
+
+
+def embedding(instance, dimensions, rng):
+    '''
+        Returns an (n, dimensions) array of the leading eigenvectors of the normalized
+        adjacency matrix of an Instance, with every row scaled to unit length
+    '''
+    num_students = len(instance.labels)
+    indptr, indices = instance.indptr, instance.indices
+    adjacency = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(num_students, num_students))
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    scale = np.zeros(num_students)
+    scale[degree > 0] = 1 / np.sqrt(degree[degree > 0])
+    normalized = diags(scale) @ adjacency @ diags(scale)
+
+    dimensions = min(dimensions, num_students - 2)
+    if dimensions < 1 or not len(indices):
+        return rng.random((num_students, max(dimensions, 1)))
+    try:
+        _, vectors = eigsh(normalized, k=dimensions, which='LA', v0=rng.random(num_students))
+    except ArpackNoConvergence as e:
+        vectors = e.eigenvectors if e.eigenvectors.shape[1] else rng.random((num_students, dimensions))
+    except ArpackError:
+        # ARPACK can fail to restart on graphs of many small components, the dense solver cannot
+        vectors = np.linalg.eigh(normalized.toarray())[1][:, -dimensions:]
+    lengths = np.linalg.norm(vectors, axis=1)
+    lengths[lengths == 0] = 1
+    return vectors / lengths[:, None]
+
+
+def initial_centers(points, count, rng):
+    '''
+        Picks count points with k-means++
+    '''
+    centers = [points[rng.integers(len(points))]]
+    distances = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(count - 1):
+        total = distances.sum()
+        pick = rng.choice(len(points), p=distances / total) if total > 0 else rng.integers(len(points))
+        centers.append(points[pick])
+        distances = np.minimum(distances, ((points - points[pick]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def capacitated_assignment(distances, size_bus):
+    '''
+        Puts every student on the closest bus with room, the students closest to a bus getting on first.
+        distances[s, b] is the distance from student s to the center of bus b.
+    '''
+    num_students, num_buses = distances.shape
+    preferences = np.argsort(distances, axis=1)
+    choice = np.zeros(num_students, dtype=np.int64)
+    bus_of = np.full(num_students, -1, dtype=np.int64)
+    room = np.full(num_buses, size_bus, dtype=np.int64)
+    waiting = np.arange(num_students)
+    while len(waiting):
+        targets = preferences[waiting, choice[waiting]]
+        full = room[targets] == 0
+        while full.any():
+            choice[waiting[full]] += 1
+            targets = preferences[waiting, choice[waiting]]
+            full = room[targets] == 0
+
+        order = np.lexsort((distances[waiting, targets], targets))
+        waiting, targets = waiting[order], targets[order]
+        admitted = np.arange(len(targets)) - np.searchsorted(targets, targets) < room[targets]
+        bus_of[waiting[admitted]] = targets[admitted]
+        room -= np.bincount(targets[admitted], minlength=num_buses)
+        waiting = waiting[~admitted]
+    return bus_of
+
+
+def fill_empty_buses(bus_of, distances):
+    '''
+        Moves onto every empty bus the closest student of a bus with more than one
+    '''
+    num_buses = distances.shape[1]
+    sizes = np.bincount(bus_of, minlength=num_buses)
+    for bus in np.flatnonzero(sizes == 0).tolist():
+        movable = sizes[bus_of] > 1
+        student = np.flatnonzero(movable)[distances[movable, bus].argmin()]
+        sizes[bus_of[student]] -= 1
+        sizes[bus] += 1
+        bus_of[student] = bus
+    return bus_of
+
+
+def break_rowdy_groups(instance, bus_of, rounds=BREAK_ROUNDS):
+    '''
+        Breaks up whole rowdy groups by moving the student of the group who keeps the most
+        friendships elsewhere onto another bus. When that bus is full, or the student is the
+        last one on theirs, the student of the other bus with the fewest friends on it takes
+        their seat. A move is undone unless it keeps more friendships.
+    '''
+    buses = [[] for _ in range(instance.num_buses)]
+    for student, bus in enumerate(bus_of.tolist()):
+        buses[bus].append(student)
+    state = RepairState(instance, buses)
+    riders = [set(bus) for bus in buses]
+
+    def move(student, bus):
+        riders[state.bus_of[student]].remove(student)
+        riders[bus].add(student)
+        state.move(student, bus)
+
+    for _ in range(rounds):
+        improved = False
+        for g, group in enumerate(state.groups):
+            if len(group) < 2 or not state.is_unbroken(g):
+                continue
+            own = state.bus_of[group[0]]
+            best = None
+            for student in group:
+                scores = state.scores_with(student)
+                for bus in range(state.num_buses):
+                    if bus != own:
+                        gain = scores[bus] - state.internal[bus]
+                        if best is None or gain > best[0]:
+                            best = (gain, student, bus)
+            if best is None:
+                continue
+
+            _, student, bus = best
+            partner = None
+            if state.sizes[bus] == state.size_bus or state.sizes[own] == 1:
+                members = set(group)
+                partner = min((u for u in riders[bus] if u not in members), key=lambda u: (state.inside[u], u), default=None)
+                if partner is None:
+                    continue
+            kept = state.kept
+            move(student, bus)
+            moves = [(student, own)]
+            if partner is not None:
+                move(partner, own)
+                moves.append((partner, bus))
+            if state.kept > kept:
+                improved = True
+            else:
+                for u, back in reversed(moves):
+                    move(u, back)
+        if not improved:
+            break
+    return np.array(state.bus_of)
+
+
+def spectral_assignment(instance, rng=None):
+    '''
+        Clusters the students of an Instance into buses
+
+        Inputs:
+            instance - an instance_cache.Instance
+            rng - a numpy Generator
+
+        Outputs:
+            a valid assignment, a list of buses of students 0..n-1
+    '''
+    rng = rng if rng is not None else np.random.default_rng()
+    num_buses = instance.num_buses
+    points = embedding(instance, min(num_buses, MAX_DIMENSIONS), rng)
+    centers = initial_centers(points, num_buses, rng)
+
+    bus_of = None
+    for _ in range(KMEANS_ROUNDS):
+        distances = (points ** 2).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        assigned = capacitated_assignment(distances, instance.size_bus)
+        if bus_of is not None and (assigned == bus_of).all():
+            break
+        bus_of = assigned
+        sums = np.zeros_like(centers)
+        np.add.at(sums, bus_of, points)
+        counts = np.bincount(bus_of, minlength=num_buses)
+        centers[counts > 0] = sums[counts > 0] / counts[counts > 0, None]
+
+    bus_of = break_rowdy_groups(instance, fill_empty_buses(bus_of, distances))
+    solution = [[] for _ in range(num_buses)]
+    for student, bus in enumerate(bus_of.tolist()):
+        solution[bus].append(student)
+    return solution
@@ -0,0 +1,342 @@
+import time
+
+import numpy as np
+
+from instance_cache import build_csr, csr_ranges, shared_groups
+from scoring import score_kernel
+
+####################################################
+# Parallel tempering over a batch of assignments of one instance.
+#
+# Every replica is one row of a NumPy assignment matrix and runs at its
+# own temperature on a geometric ladder. Each step proposes one move (or,
+# onto a full bus, one swap) for every replica at once and prices all of
+# them together from friend count tables. Replicas on neighboring rungs
+# trade temperatures from time to time, so assignments found hot can cool
+# down and cold ones can escape.
+#
+# Moves which would put a whole rowdy group on one bus are never made, so
+# as long as no replica starts with one the energy of a replica is exactly
+# its number of kept friendships. Students of a rowdy group of one never
+# count, so their friendships are left out altogether.
+####################################################
+
+REPLICAS = 16
+
+# temperatures of the coldest and the hottest replica, in friendships
+COLDEST = 0.05
+HOTTEST = 2.0
+
+# steps between replica exchanges, and between checks of the time budget
+EXCHANGE_EVERY = 10
+
+# chance that a proposal sends a student to the bus of a random friend
+# rather than to a random bus
+FRIEND_MOVES = 0.8
+
+TIME_BUDGET = 10.0
+
+
+def _contains(keys, queries):
+    '''
+        Returns which of queries are in the sorted array keys
+    '''
+    if not len(keys):
+        return np.zeros(len(queries), dtype=bool)
+    found = np.searchsorted(keys, queries)
+    return keys[np.minimum(found, len(keys) - 1)] == queries
+
+
+class Tempering:
+    '''
+        A batch of assignments of an Instance annealed together
+
+        Inputs:
+            instance - an instance_cache.Instance with at least two buses
+            replicas - the number of assignments, one per temperature
+            buses - a valid assignment (a list of buses of students 0..n-1) every replica
+                    starts from, or None to start each replica from a random one
+            rng - a numpy Generator
+    '''
+
+    def __init__(self, instance, replicas=REPLICAS, buses=None, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.instance = instance
+        self.num_students = n = len(instance.labels)
+        self.num_buses = instance.num_buses
+        self.size_bus = instance.size_bus
+        self.replicas = replicas
+        self.rows = np.arange(replicas)
+
+        # only the rowdy groups of two or more students can be made whole
+        group_ptr, _, self.member_ptr, self.member_groups, lonely = shared_groups(instance)
+        self.num_groups = num_groups = len(group_ptr) - 1
+        self.group_sizes = np.diff(group_ptr)
+        self.member_count = np.diff(self.member_ptr)
+
+        edges = instance.edges
+        keep = (edges[:, 0] != edges[:, 1]) & ~lonely[edges[:, 0]] & ~lonely[edges[:, 1]]
+        self.indptr, self.indices = build_csr(n, edges[keep])
+        self.degree = np.diff(self.indptr)
+        heads = np.repeat(np.arange(n), self.degree)
+        self.heads = heads
+        # CSR rows are sorted, so these keys are too
+        self.adjacent_keys = heads * n + self.indices
+
+        self.member_keys = np.repeat(np.arange(n), self.member_count) * num_groups + self.member_groups
+
+        if buses is None:
+            self.bus_of = np.array([self._random_assignment() for _ in range(replicas)], dtype=np.int64)
+        else:
+            start = np.zeros(n, dtype=np.int64)
+            for i, bus in enumerate(buses):
+                start[list(bus)] = i
+            self.bus_of = np.tile(start, (replicas, 1))
+        self._build()
+
+    def _random_assignment(self):
+        '''
+            Returns a random assignment, putting every student on a random bus with room
+            where they do not complete a rowdy group if there is one
+        '''
+        n = self.num_students
+        order = self.rng.permutation(n)
+        bus_of = np.empty(n, dtype=np.int64)
+        occupancy = np.zeros((self.num_groups, self.num_buses), dtype=np.int64)
+        # one student starts every bus, which cannot make a group whole
+        firsts = order[:self.num_buses]
+        bus_of[firsts] = np.arange(self.num_buses)
+        for student, bus in zip(firsts.tolist(), range(self.num_buses)):
+            occupancy[self.member_groups[self.member_ptr[student]:self.member_ptr[student + 1]], bus] += 1
+        room = np.full(self.num_buses, self.size_bus - 1)
+        for student in order[self.num_buses:].tolist():
+            open_buses = room > 0
+            groups = self.member_groups[self.member_ptr[student]:self.member_ptr[student + 1]]
+            if len(groups):
+                completes = (occupancy[groups] + 1 == self.group_sizes[groups, None]).any(axis=0)
+                if (open_buses & ~completes).any():
+                    open_buses &= ~completes
+            choices = np.flatnonzero(open_buses)
+            bus = choices[self.rng.integers(len(choices))]
+            bus_of[student] = bus
+            room[bus] -= 1
+            occupancy[groups, bus] += 1
+        return bus_of
+
+    def _build(self):
+        '''
+            Builds the friend counts, rowdy group counts and bus lists of every replica
+        '''
+        rows = self.rows
+        n = self.num_students
+        num_buses = self.num_buses
+        bus_of = self.bus_of
+
+        # friends[r, s, b] - the number of friends student s has on bus b in replica r
+        self.friends = np.zeros((self.replicas, n, num_buses), dtype=np.int16)
+        count = len(self.heads)
+        replica = np.repeat(rows, count)
+        heads = np.tile(self.heads, self.replicas)
+        tails = np.tile(self.indices, self.replicas)
+        np.add.at(self.friends, (replica, heads, bus_of[replica, tails]), 1)
+
+        # occupancy[r, g, b] - the number of students of group g on bus b in replica r
+        self.occupancy = np.zeros((self.replicas, self.num_groups, num_buses), dtype=np.int16)
+        students = np.repeat(np.arange(n), self.member_count)
+        replica = np.repeat(rows, len(students))
+        np.add.at(self.occupancy, (replica, np.tile(self.member_groups, self.replicas),
+                                   bus_of[replica, np.tile(students, self.replicas)]), 1)
+
+        # members[r, b, :sizes[r, b]] lists the students of bus b and position[r, s] is the
+        # index of s in its bus, one spare slot lets a full bus take a student before a swap
+        self.sizes = np.zeros((self.replicas, num_buses), dtype=np.int64)
+        self.members = np.zeros((self.replicas, num_buses, self.size_bus + 1), dtype=np.int64)
+        self.position = np.zeros((self.replicas, n), dtype=np.int64)
+        for r in rows:
+            order = np.argsort(bus_of[r], kind='stable')
+            sizes = np.bincount(bus_of[r], minlength=num_buses)
+            firsts = np.cumsum(sizes) - sizes
+            slots = np.arange(n) - np.repeat(firsts, sizes)
+            self.sizes[r] = sizes
+            self.members[r, bus_of[r, order], slots] = order
+            self.position[r, order] = slots
+
+        self.energy = self.friends[np.repeat(rows, n), np.tile(np.arange(n), self.replicas),
+                                   bus_of.ravel()].reshape(self.replicas, n).sum(axis=1).astype(np.int64) // 2
+
+    def _relocate(self, rows, students, sources, targets):
+        '''
+            Moves students[i] from sources[i] to targets[i] in replica rows[i], rows must be distinct
+        '''
+        # flat indices into friends and occupancy, whose last axis is the bus
+        lengths = self.degree[students]
+        friends = self.indices[csr_ranges(self.indptr[students], lengths)]
+        cells = (np.repeat(rows * self.num_students, lengths) + friends) * self.num_buses
+        flat = self.friends.reshape(-1)
+        flat[cells + np.repeat(sources, lengths)] -= 1
+        flat[cells + np.repeat(targets, lengths)] += 1
+
+        lengths = self.member_count[students]
+        if lengths.any():
+            groups = self.member_groups[csr_ranges(self.member_ptr[students], lengths)]
+            cells = (np.repeat(rows * self.num_groups, lengths) + groups) * self.num_buses
+            flat = self.occupancy.reshape(-1)
+            flat[cells + np.repeat(sources, lengths)] -= 1
+            flat[cells + np.repeat(targets, lengths)] += 1
+
+        self.bus_of[rows, students] = targets
+        slots = self.position[rows, students]
+        last = self.members[rows, sources, self.sizes[rows, sources] - 1]
+        self.members[rows, sources, slots] = last
+        self.position[rows, last] = slots
+        self.members[rows, targets, self.sizes[rows, targets]] = students
+        self.position[rows, students] = self.sizes[rows, targets]
+        self.sizes[rows, sources] -= 1
+        self.sizes[rows, targets] += 1
+
+    def _completes(self, joining, target, leaving, active):
+        '''
+            Returns, for every replica, whether joining[r] getting on bus target[r] while
+            leaving[r] gets off it would put a whole rowdy group on that bus. leaving only
+            counts where active is set.
+        '''
+        completes = np.zeros(self.replicas, dtype=bool)
+        lengths = self.member_count[joining] * active
+        if not lengths.any():
+            return completes
+        replica = np.repeat(self.rows, lengths)
+        groups = self.member_groups[csr_ranges(self.member_ptr[joining], lengths)]
+        counts = self.occupancy[replica, groups, target[replica]] + 1
+        # leaving[r] is -1 when nobody gets off, which matches no key
+        counts -= _contains(self.member_keys, leaving[replica] * self.num_groups + groups)
+        completes[replica[counts == self.group_sizes[groups]]] = True
+        return completes
+
+    def step(self, betas):
+        '''
+            Proposes one move or swap in every replica and accepts each with the
+            Metropolis rule at inverse temperature betas[r]
+        '''
+        rng = self.rng
+        rows = self.rows
+        students = rng.integers(self.num_students, size=self.replicas)
+        sources = self.bus_of[rows, students]
+
+        degree = self.degree[students]
+        random_buses = (sources + rng.integers(1, self.num_buses, size=self.replicas)) % self.num_buses
+        if len(self.indices):
+            picks = self.indptr[students] + (rng.random(self.replicas) * degree).astype(np.int64)
+            friend_buses = self.bus_of[rows, self.indices[np.minimum(picks, len(self.indices) - 1)]]
+            befriend = (degree > 0) & (rng.random(self.replicas) < FRIEND_MOVES)
+            targets = np.where(befriend, friend_buses, random_buses)
+        else:
+            targets = random_buses
+
+        swap = self.sizes[rows, targets] >= self.size_bus
+        partners = self.members[rows, targets, rng.integers(self.size_bus, size=self.replicas)]
+        valid = (targets != sources) & (swap | (self.sizes[rows, sources] > 1))
+
+        friends = self.friends
+        gains = friends[rows, students, targets].astype(np.int64) - friends[rows, students, sources]
+        partner_gains = (friends[rows, partners, sources].astype(np.int64) - friends[rows, partners, targets]
+                         - 2 * _contains(self.adjacent_keys, students * self.num_students + partners))
+        gains += np.where(swap, partner_gains, 0)
+
+        if self.num_groups:
+            outgoing = np.where(swap, partners, -1)
+            incoming = np.where(swap, students, -1)
+            valid &= ~self._completes(students, targets, outgoing, np.ones(self.replicas, dtype=np.int64))
+            valid &= ~self._completes(partners, sources, incoming, swap.astype(np.int64))
+
+        accept = valid & (rng.random(self.replicas) < np.exp(np.minimum(gains, 0) * betas))
+        moved = rows[accept]
+        self._relocate(moved, students[accept], sources[accept], targets[accept])
+        swapped = accept & swap
+        self._relocate(rows[swapped], partners[swapped], targets[swapped], sources[swapped])
+        self.energy[accept] += gains[accept]
+
+    def run(self, time_budget=TIME_BUDGET, coldest=COLDEST, hottest=HOTTEST, report=None):
+        '''
+            Anneals until time_budget seconds have passed, calling report with the
+            assignment of highest energy after every exchange of replicas which raised it
+
+            Outputs:
+                (bus_of, energy)
+                bus_of - the assignment with the highest energy seen, an array holding the bus of every student
+                energy - its energy
+        '''
+        rng = self.rng
+        # rung i of the ladder is held by replica ladder[i], the coldest rung first
+        rung_betas = 1 / np.geomspace(coldest, hottest, self.replicas)
+        ladder = np.arange(self.replicas)
+        betas = rung_betas.copy()
+
+        best = int(self.energy.max())
+        best_bus_of = self.bus_of[self.energy.argmax()].copy()
+        parity = 0
+        deadline = time.perf_counter() + time_budget
+        while time.perf_counter() < deadline:
+            improved = False
+            for _ in range(EXCHANGE_EVERY):
+                self.step(betas)
+                top = self.energy.argmax()
+                if self.energy[top] > best:
+                    best = int(self.energy[top])
+                    best_bus_of = self.bus_of[top].copy()
+                    improved = True
+            if improved and report is not None:
+                report(best_bus_of)
+
+            rungs = np.arange(parity, self.replicas - 1, 2)
+            colder, hotter = ladder[rungs], ladder[rungs + 1]
+            chances = np.exp(np.minimum((rung_betas[rungs] - rung_betas[rungs + 1])
+                                        * (self.energy[hotter] - self.energy[colder]), 0))
+            trade = rungs[rng.random(len(rungs)) < chances]
+            ladder[trade], ladder[trade + 1] = ladder[trade + 1], ladder[trade].copy()
+            betas[ladder] = rung_betas
+            parity = 1 - parity
+        return best_bus_of, best
+
+
+def _solution(bus_of, num_buses):
+    solution = [[] for _ in range(num_buses)]
+    for student, bus in enumerate(bus_of.tolist()):
+        solution[bus].append(student)
+    return solution
+
+
+def anneal(instance, time_budget=TIME_BUDGET, buses=None, replicas=REPLICAS, seed=None, callback=None):
+    '''
+        Runs parallel tempering on an Instance
+
+        Inputs:
+            instance - an instance_cache.Instance
+            time_budget - the number of seconds to anneal for
+            buses - a valid assignment to start every replica from, random ones if None
+            replicas - the number of replicas annealed together
+            seed - a seed for the random number generator
+            callback - called with every assignment of higher energy found while annealing
+
+        Outputs:
+            (solution, score)
+            solution - the best assignment found, a list of buses of students 0..n-1
+            score - the score of solution, as computed by score_output
+    '''
+    num_students = len(instance.labels)
+    if instance.num_buses < 2:
+        return [list(range(num_students))], 0
+    tempering = Tempering(instance, replicas, buses, np.random.default_rng(seed))
+    bus_of, kept = tempering.bus_of[0], 0
+    if len(instance.edges):
+        # energies overcount when a replica could not help keeping a rowdy group whole,
+        # so the final replicas compete with the best one seen on their exact scores
+        report = None
+        if callback is not None:
+            report = lambda bus_of: callback(_solution(bus_of, instance.num_buses))
+        best_bus_of, _ = tempering.run(time_budget, report=report)
+        for candidate in [best_bus_of] + list(tempering.bus_of):
+            _, candidate_kept, _ = score_kernel(candidate, instance.edges, instance.rowdy_ptr, instance.rowdy_members)
+            if candidate_kept > kept:
+                bus_of, kept = candidate, candidate_kept
+
+    return _solution(bus_of, instance.num_buses), kept / len(instance.edges) if len(instance.edges) else 0
@@ -0,0 +1,50 @@
+import random
+
+import networkx as nx
+
+from assignment_state import AssignmentState
+from instance_cache import graph_instance
+from repair_state import RepairState
+
+
+def rescored(instance, buses, student, bus):
+    '''
+        Returns the kept friendships of every bus after moving student onto bus, counted from scratch
+    '''
+    moved = [[s for s in students if s != student] for students in buses]
+    moved[bus].append(student)
+    return AssignmentState(instance, moved).internal
+
+
+def check_scores_with(graph, constraints, buses):
+    instance = graph_instance(graph, len(buses), graph.number_of_nodes(), constraints)
+    state = RepairState(instance, buses)
+    for student in graph.nodes():
+        scores = state.scores_with(student)
+        for bus in range(len(buses)):
+            if bus != state.bus_of[student]:
+                assert scores[bus] == rescored(instance, buses, student, bus)[bus], (student, bus)
+
+
+def test_scores_with_lonely_student():
+    graph = nx.Graph()
+    graph.add_nodes_from(range(4))
+    graph.add_edges_from([(0, 1), (0, 2), (2, 3)])
+    instance = graph_instance(graph, 2, 4, [[0]])
+    state = RepairState(instance, [[0, 1], [2, 3]])
+    assert state.scores_with(0) == [0, 1]
+    check_scores_with(graph, [[0]], [[0, 1], [2, 3]])
+
+
+def test_scores_with_random_instances():
+    rng = random.Random(0)
+    for _ in range(50):
+        num_students = rng.randint(4, 12)
+        graph = nx.gnp_random_graph(num_students, 0.4, seed=rng.randint(0, 10 ** 6))
+        graph.add_edges_from((s, s) for s in range(num_students) if rng.random() < 0.1)
+        constraints = [rng.sample(range(num_students), rng.randint(1, 3)) for _ in range(rng.randint(0, 4))]
+        num_buses = rng.randint(2, 4)
+        bus_of = [rng.randrange(num_buses) for _ in range(num_students)]
+        bus_of[:num_buses] = range(num_buses)
+        buses = [[s for s in range(num_students) if bus_of[s] == bus] for bus in range(num_buses)]
+        check_scores_with(graph, constraints, buses)